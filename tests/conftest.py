@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -36,4 +38,26 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_perf',
 ]
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    # Фоновые потоки миниатюр не должны писать во временный MEDIA_ROOT
+    # после завершения теста.
+    settings.THUMBNAIL_QUEUE_WORKERS = 0
+
+
+
+@pytest.fixture(scope='session', autouse=True)
+def private_cache(tmp_path_factory):
+    # Общий кэш процессов лежит во временном каталоге системы: тесты
+    # не должны видеть его содержимое, оставшееся от других прогонов.
+    from core.cache import relocate
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    directory = str(tmp_path_factory.mktemp('cache'))
+    with override_settings(CACHES=relocate(settings.CACHES, directory)):
+        yield
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+from benchmark.dataset import seed_dataset
+from django.contrib.auth import get_user_model
+from posts.models import Comment, Follow, Group, Post
+
+# Размер набора данных задаётся переменными окружения, например
+# PERF_USERS=10000 PERF_POSTS=1000000 PERF_GROUPS=100 PERF_FOLLOWS=200.
+PERF_DATASET = {
+    'users': int(os.getenv('PERF_USERS', 50)),
+    'groups': int(os.getenv('PERF_GROUPS', 5)),
+    'posts': int(os.getenv('PERF_POSTS', 500)),
+    'follows': int(os.getenv('PERF_FOLLOWS', 10)),
+    'comments': int(os.getenv('PERF_COMMENTS', 200)),
+}
+
+
+@pytest.fixture(scope='module')
+def perf_dataset(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        data = seed_dataset(PERF_DATASET)
+        yield data
+        Comment.objects.all().delete()
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        get_user_model().objects.all().delete()
@@ -0,0 +1,125 @@
+"""Бюджеты запросов и времени ответа для всех адресов posts.urls.
+
+Базовые значения лежат в `perf_baseline.json`. Чтобы перезаписать их
+после осознанного изменения, запустите тесты с PERF_UPDATE_BASELINE=1.
+Число SQL-запросов проверяется всегда, а p95 — только с
+PERF_CHECK_LATENCY=1: базовое время снято на одной машине и на других
+(например, в CI) даёт ложные падения.
+"""
+import json
+import os
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from benchmark.load import percentile
+from tests.fixtures.fixture_perf import PERF_DATASET
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'perf_baseline.json')
+UPDATE_BASELINE = os.getenv('PERF_UPDATE_BASELINE') == '1'
+CHECK_LATENCY = os.getenv('PERF_CHECK_LATENCY') == '1'
+REPEAT = int(os.getenv('PERF_REPEAT', 5))
+# Во сколько раз p95 может превысить базовое значение.
+LATENCY_TOLERANCE = float(os.getenv('PERF_LATENCY_TOLERANCE', 3))
+# Запас в миллисекундах, чтобы быстрые адреса не падали от шума.
+LATENCY_SLACK_MS = float(os.getenv('PERF_LATENCY_SLACK_MS', 25))
+
+ROUTES = {
+    'posts:index': ('get', lambda data: reverse('posts:index')),
+    'posts:group_list': ('get', lambda data: reverse(
+        'posts:group_list', args=[data['group'].slug])),
+    'posts:profile': ('get', lambda data: reverse(
+        'posts:profile', args=[data['reader'].username])),
+    'posts:post_detail': ('get', lambda data: reverse(
+        'posts:post_detail', args=[data['post'].pk])),
+    'posts:search': ('get', lambda data: reverse(
+        'posts:search') + '?q=' + data['post'].text.split()[0]),
+    'posts:post_create': ('get', lambda data: reverse('posts:post_create')),
+    'posts:post_edit': ('get', lambda data: reverse(
+        'posts:post_edit', args=[data['post'].pk])),
+    'posts:add_comment': ('post', lambda data: reverse(
+        'posts:add_comment', args=[data['post'].pk])),
+    'posts:follow_index': ('get', lambda data: reverse('posts:follow_index')),
+    'posts:profile_follow': ('get', lambda data: reverse(
+        'posts:profile_follow', args=[data['post'].author.username])),
+    'posts:profile_unfollow': ('get', lambda data: reverse(
+        'posts:profile_unfollow', args=[data['post'].author.username])),
+}
+MEASURED = {}
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def write_baseline():
+    yield
+    if UPDATE_BASELINE and MEASURED:
+        baseline = {'dataset': PERF_DATASET, 'routes': MEASURED}
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as output:
+            json.dump(baseline, output, indent=2, sort_keys=True)
+            output.write('\n')
+
+
+@pytest.mark.django_db
+class TestPerformanceBudget:
+
+    @pytest.mark.parametrize('route', sorted(ROUTES))
+    def test_route_budget(self, route, client, perf_dataset):
+        method, make_url = ROUTES[route]
+        url = make_url(perf_dataset)
+        client.force_login(perf_dataset['reader'])
+        data = {'text': 'Комментарий'} if method == 'post' else None
+        queries = []
+        timings = []
+        for _ in range(REPEAT):
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            assert response.status_code in (200, 302), (
+                f'Адрес `{url}` ответил кодом {response.status_code}'
+            )
+        result = {
+            'queries': max(queries),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+        }
+        MEASURED[route] = result
+        if UPDATE_BASELINE:
+            return
+
+        baseline = load_baseline()
+        expected = baseline.get('routes', {}).get(route)
+        assert expected is not None, (
+            f'Для `{route}` нет базового значения в perf_baseline.json, '
+            'запустите тесты с PERF_UPDATE_BASELINE=1'
+        )
+        assert result['queries'] <= expected['queries'], (
+            f'`{route}` выполняет {result["queries"]} SQL-запросов, '
+            f'бюджет: {expected["queries"]}'
+        )
+        if CHECK_LATENCY and baseline.get('dataset') == PERF_DATASET:
+            limit = expected['p95_ms'] * LATENCY_TOLERANCE + LATENCY_SLACK_MS
+            assert result['p95_ms'] <= limit, (
+                f'p95 для `{route}` — {result["p95_ms"]} мс, '
+                f'допустимо не больше {limit:.2f} мс'
+            )
+
+    def test_every_route_has_budget(self):
+        from posts.urls import app_name, urlpatterns
+
+        names = {f'{app_name}:{pattern.name}' for pattern in urlpatterns}
+        assert names == set(ROUTES), (
+            'Добавьте новые адреса posts.urls в бюджет производительности'
+        )
@@ -0,0 +1,39 @@
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from core.cache import relocate
+
+
+@contextmanager
+def temporary_database(workdir, **overrides):
+    """Временные база, кэш и MEDIA_ROOT в ``workdir``, рабочие не трогаются.
+
+    ``overrides`` временно подменяют настройки соединения, например
+    ``PRAGMAS`` или ``CONN_MAX_AGE``.
+    """
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict.get(key) for key in overrides}
+    test_name = settings_dict['TEST'].get('NAME')
+    settings_dict.update(overrides)
+    if connection.vendor == 'sqlite':
+        # Файл, а не память: потоки должны видеть общую базу.
+        settings_dict['TEST']['NAME'] = os.path.join(
+            workdir, 'benchmark.sqlite3')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(
+                MEDIA_ROOT=workdir,
+                CACHES=relocate(settings.CACHES, workdir)):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        settings_dict.update(saved)
+        settings_dict['TEST']['NAME'] = test_name
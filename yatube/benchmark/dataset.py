@@ -0,0 +1,100 @@
+"""Синтетический набор данных для нагрузочных прогонов и тестов скорости."""
+import io
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post
+
+DEFAULT_DATASET = {
+    'users': 50,
+    'groups': 5,
+    'posts': 500,
+    'follows': 10,
+    'comments': 200,
+    'images': 0,
+}
+BATCH_SIZE = 5000
+IMAGE_SIZE = (1200, 800)
+
+
+def _bulk(model, objs):
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _save_images(count, rand):
+    names = []
+    for number in range(count):
+        content = io.BytesIO()
+        color = tuple(rand.randrange(256) for _ in range(3))
+        Image.new('RGB', IMAGE_SIZE, color).save(content, 'JPEG')
+        names.append(default_storage.save(
+            f'posts/benchmark_{number}.jpg', ContentFile(content.getvalue())))
+    return names
+
+
+def seed_dataset(dataset, seed=0):
+    """Заполняет базу и возвращает объекты, по которым ходит нагрузка.
+
+    Посты раскладываются по случайным авторам и группам, каждый
+    пользователь подписан на ``follows`` случайных авторов, комментарии
+    собраны на одном «горячем» посте, ``images`` картинок достаются
+    случайным постам.
+    """
+    dataset = {**DEFAULT_DATASET, **dataset}
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rand = random.Random(seed)
+    users = mixer.cycle(dataset['users']).blend(
+        get_user_model(), username=mixer.sequence('perf_user_{0}'))
+    groups = mixer.cycle(dataset['groups']).blend(
+        Group, slug=mixer.sequence('perf-group-{0}'))
+    user_ids = [user.pk for user in users]
+    group_ids = [group.pk for group in groups] + [None]
+    images = _save_images(dataset['images'], rand)
+    _bulk(Post, (
+        Post(
+            text=fake.text(max_nb_chars=200),
+            author_id=rand.choice(user_ids),
+            group_id=rand.choice(group_ids),
+            image=rand.choice(images) if images else '',
+        )
+        for _ in range(dataset['posts'])
+    ))
+    _bulk(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in rand.sample(
+            user_ids, min(dataset['follows'], len(user_ids)))
+        if author_id != user_id
+    ))
+    post = Post.objects.create(
+        text=fake.text(max_nb_chars=200), author=users[0], group=groups[0])
+    _bulk(Comment, (
+        Comment(
+            post=post,
+            author_id=rand.choice(user_ids),
+            text=fake.sentence(),
+        )
+        for _ in range(dataset['comments'])
+    ))
+    return {
+        'reader': users[0],
+        'post': post,
+        'group': groups[0],
+        'users': users,
+        'groups': groups,
+        'words': post.text.split(),
+    }
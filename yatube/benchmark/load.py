@@ -0,0 +1,185 @@
+"""Параллельная нагрузка на настоящие view через ``django.test.Client``.
+
+Читатели открывают ленты, профили, страницы постов и поиск, писатели
+публикуют посты, комментируют и подписываются. Каждый поток работает
+со своим клиентом и своим соединением с базой, задержки собираются
+по именам маршрутов.
+"""
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from posts import thumbnails
+
+
+def _page(rand):
+    return f'?page={rand.randint(1, 3)}'
+
+
+READ_ROUTES = {
+    'posts:index': lambda data, rand: reverse('posts:index') + _page(rand),
+    'posts:group_list': lambda data, rand: reverse(
+        'posts:group_list', args=[rand.choice(data['groups']).slug]),
+    'posts:profile': lambda data, rand: reverse(
+        'posts:profile', args=[rand.choice(data['users']).username]),
+    'posts:post_detail': lambda data, rand: reverse(
+        'posts:post_detail', args=[data['post'].pk]),
+    'posts:follow_index': lambda data, rand: reverse(
+        'posts:follow_index') + _page(rand),
+    'posts:search': lambda data, rand: reverse(
+        'posts:search') + '?q=' + rand.choice(data['words']),
+}
+
+
+def _create_post(client, data, rand):
+    return client.post(reverse('posts:post_create'), {
+        'text': ' '.join(rand.sample(data['words'], 3)),
+        'group': rand.choice(data['groups']).pk,
+    })
+
+
+def _add_comment(client, data, rand):
+    return client.post(
+        reverse('posts:add_comment', args=[data['post'].pk]),
+        {'text': rand.choice(data['words'])}
+    )
+
+
+def _follow(client, data, rand):
+    author = rand.choice(data['users']).username
+    if rand.random() < 0.5:
+        return client.get(reverse('posts:profile_follow', args=[author]))
+    return client.get(reverse('posts:profile_unfollow', args=[author]))
+
+
+WRITE_ROUTES = {
+    'posts:post_create': _create_post,
+    'posts:add_comment': _add_comment,
+    'posts:follow': _follow,
+}
+
+
+class Recorder:
+    """Собирает задержки и ошибки со всех потоков."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, route, elapsed, failed):
+        with self.lock:
+            self.latencies[route].append(elapsed * 1000)
+            if failed:
+                self.errors[route] += 1
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, int(round(percent / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def _summary(latencies, errors, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p90_ms': round(percentile(latencies, 90), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+    }
+
+
+def _worker(client, routes, data, recorder, start, stop, requests, seed):
+    rand = random.Random(seed)
+    start.wait()
+    done = 0
+    try:
+        while not stop.is_set() and (requests is None or done < requests):
+            route = rand.choice(list(routes))
+            started = time.perf_counter()
+            try:
+                response = routes[route](client, data, rand)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            recorder.add(route, time.perf_counter() - started, failed)
+            done += 1
+    finally:
+        connections.close_all()
+
+
+def _read(route):
+    return lambda client, data, rand: client.get(route(data, rand))
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(data, readers, writers, duration=None, requests=None, seed=0):
+    """Запускает читателей и писателей и возвращает отчёт.
+
+    Прогон длится ``duration`` секунд или, если задан ``requests``,
+    пока каждый поток не сделает столько запросов.
+    """
+    read_routes = {name: _read(route) for name, route in READ_ROUTES.items()}
+    recorder = Recorder()
+    start = threading.Barrier(readers + writers + 1)
+    stop = threading.Event()
+    workers = [read_routes] * readers + [WRITE_ROUTES] * writers
+    threads = []
+    for number, routes in enumerate(workers):
+        # Входим заранее и по очереди: сессии не должны попадать в замер.
+        client = Client()
+        client.force_login(random.Random(seed + number).choice(data['users']))
+        threads.append(threading.Thread(target=_worker, args=(
+            client, routes, data, recorder, start, stop, requests,
+            seed + number)))
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    if requests is None:
+        stop.wait(duration)
+        stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    thumbnails.wait()
+
+    routes = {
+        route: _summary(latencies, recorder.errors[route], elapsed)
+        for route, latencies in sorted(recorder.latencies.items())
+    }
+    everything = [
+        value for latencies in recorder.latencies.values()
+        for value in latencies
+    ]
+    return {
+        'commit': commit(),
+        'readers': readers,
+        'writers': writers,
+        'seconds': round(elapsed, 2),
+        'total': _summary(
+            everything, sum(recorder.errors.values()), elapsed
+        ) if everything else {'requests': 0},
+        'routes': routes,
+    }
@@ -0,0 +1,51 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from benchmark import load
+from benchmark.database import temporary_database
+from benchmark.dataset import DEFAULT_DATASET, seed_dataset
+
+
+class Command(BaseCommand):
+    help = ('Заполняет временную базу синтетическими данными, гоняет по '
+            'view параллельных читателей и писателей и печатает JSON '
+            'с пропускной способностью и перцентилями задержек.')
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_DATASET.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность прогона в секундах.')
+        parser.add_argument(
+            '--requests', type=int,
+            help='Сколько запросов делает каждый поток (вместо --duration).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для отчёта вместо stdout.')
+
+    def handle(self, *args, **options):
+        dataset = {name: options[name] for name in DEFAULT_DATASET}
+        with tempfile.TemporaryDirectory() as workdir:
+            report = self.benchmark(workdir, dataset, options)
+        report = {'dataset': dataset, **report}
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+    def benchmark(self, workdir, dataset, options):
+        with temporary_database(workdir):
+            self.stderr.write('Заполняю базу...')
+            data = seed_dataset(dataset, options['seed'])
+            self.stderr.write('Запускаю нагрузку...')
+            return load.run(
+                data, options['readers'], options['writers'],
+                duration=options['duration'],
+                requests=options['requests'], seed=options['seed'],
+            )
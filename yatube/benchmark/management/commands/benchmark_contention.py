@@ -0,0 +1,51 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from benchmark import load
+from benchmark.database import temporary_database
+from benchmark.dataset import seed_dataset
+
+# Стандартный SQLite (rollback journal, новое соединение на запрос)
+# против настроек из DATABASES.
+PROFILES = {
+    'defaults': {
+        'PRAGMAS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+    },
+    'tuned': {},
+}
+DATASET = {'users': 50, 'groups': 5, 'posts': 500, 'follows': 10}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность N параллельных писателей '
+            'на стандартном SQLite и с настройками соединения из DATABASES.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=0)
+        parser.add_argument('--duration', type=float, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, overrides in PROFILES.items():
+            self.stderr.write(f'Профиль {name}...')
+            with tempfile.TemporaryDirectory() as workdir:
+                with temporary_database(workdir, **overrides):
+                    data = seed_dataset(DATASET, options['seed'])
+                    report = load.run(
+                        data, options['readers'], options['writers'],
+                        duration=options['duration'], seed=options['seed'])
+            results[name] = report['total']
+        defaults, tuned = results['defaults'], results['tuned']
+        self.stdout.write(json.dumps({
+            'commit': load.commit(),
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'profiles': results,
+            'throughput_gain': round(
+                tuned['rps'] / defaults['rps'], 2
+            ) if defaults.get('rps') else None,
+        }, ensure_ascii=False, indent=2))
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+
+from benchmark import load
+from benchmark.dataset import seed_dataset
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_QUEUE_WORKERS=0)
+class LoadRunTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.data = seed_dataset({
+            'users': 3, 'groups': 2, 'posts': 10, 'follows': 2,
+            'comments': 3,
+        })
+
+    def assertReport(self, report, requests):
+        self.assertEqual(report['total']['requests'], requests)
+        self.assertEqual(report['total']['errors'], 0)
+        for summary in report['routes'].values():
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+            self.assertLessEqual(summary['p99_ms'], summary['max_ms'])
+
+    def test_readers_report_every_request(self):
+        """Каждый читатель делает заданное число запросов без ошибок."""
+        report = load.run(self.data, readers=2, writers=0, requests=6)
+        self.assertReport(report, 12)
+        self.assertLessEqual(set(report['routes']), set(load.READ_ROUTES))
+
+    def test_writers_report_every_request(self):
+        """Писатель публикует, комментирует и подписывается без ошибок."""
+        report = load.run(self.data, readers=0, writers=1, requests=6)
+        self.assertReport(report, 6)
+        self.assertLessEqual(set(report['routes']), set(load.WRITE_ROUTES))
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(load.percentile(values, 50), 50)
+        self.assertEqual(load.percentile(values, 99), 99)
+        self.assertEqual(load.percentile([7], 95), 7)
+
+
+class MixedLoadTest(SimpleTestCase):
+    def test_readers_and_writers_run_together(self):
+        """Читатели и писатель работают одновременно, с картинкой в наборе,
+        на файловой базе из temporary_database.
+
+        Тестовая база раннера живёт в памяти, а вторую тестовую среду в том
+        же процессе не поднять, поэтому команда запускается отдельно.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            result = subprocess.run([
+                sys.executable, 'manage.py', 'benchmark',
+                '--users', '3', '--groups', '2', '--posts', '10',
+                '--follows', '2', '--comments', '3', '--images', '1',
+                '--readers', '2', '--writers', '1', '--requests', '6',
+                '--output', path,
+            ], cwd=settings.BASE_DIR, stderr=subprocess.PIPE,
+                universal_newlines=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            with open(path, encoding='utf-8') as report:
+                report = json.load(report)
+        self.assertEqual(report['total']['requests'], 18)
+        self.assertEqual(report['total']['errors'], 0)
+        routes = set(report['routes'])
+        self.assertTrue(routes & set(load.READ_ROUTES))
+        self.assertTrue(routes & set(load.WRITE_ROUTES))
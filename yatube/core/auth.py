@@ -0,0 +1,60 @@
+"""Кэш пользователя сессии поверх ``django.contrib.auth.get_user``.
+
+Пользователь кладётся в кэш по ключу сессии на ``USER_CACHE_TIMEOUT``
+секунд вместе с версией пользователя. Любое сохранение пользователя
+(смена пароля, блокировка, правка профиля) увеличивает версию, а выход
+удаляет запись, поэтому устаревший объект не переживает изменения.
+Хэш сессии сверяется как в Django: после смены пароля другие сессии
+перестают пускать даже из кэша.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+
+from . import versions
+
+
+def _user_key(session_key):
+    return f'auth-user:{session_key}'
+
+
+def _version_key(user_id):
+    return f'auth-user-version:{user_id}'
+
+
+def bump_version(user_id):
+    versions.bump(_version_key(user_id))
+
+
+def forget_session(session_key):
+    if session_key:
+        cache.delete(_user_key(session_key))
+
+
+def _verified(request, user):
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    return session_hash and constant_time_compare(
+        session_hash, user.get_session_auth_hash())
+
+
+def get_user(request):
+    """Пользователь сессии из кэша или, при промахе, из базы."""
+    session = request.session
+    session_key = session.session_key
+    user_id = session.get(auth.SESSION_KEY)
+    if (not session_key or user_id is None
+            or session.get(BACKEND_SESSION_KEY)
+            not in settings.AUTHENTICATION_BACKENDS):
+        return auth.get_user(request)
+    found = cache.get_many([_user_key(session_key), _version_key(user_id)])
+    (version,) = versions.get_many([_version_key(user_id)], found)
+    cached = found.get(_user_key(session_key))
+    if cached and cached[0] == version and _verified(request, cached[1]):
+        return cached[1]
+    user = auth.get_user(request)
+    if user.is_authenticated and session.session_key == session_key:
+        cache.set(_user_key(session_key), (version, user),
+                  settings.USER_CACHE_TIMEOUT)
+    return user
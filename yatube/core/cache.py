@@ -0,0 +1,263 @@
+"""Общий для всех процессов кэш на файлах SQLite без отдельного сервиса.
+
+Ключи раскладываются по ``SHARDS`` файлам по crc32, поэтому процессы
+и потоки реже ждут блокировку одного файла. Каждый шард хранит не
+больше ``MAX_ENTRIES / SHARDS`` записей и при переполнении вытесняет
+давно не читавшиеся (LRU с точностью до ``ACCESS_RESOLUTION`` секунд).
+Попадания, промахи и вытеснения копятся в процессе и периодически
+сбрасываются в шард, ``stats()`` возвращает сумму по всем процессам.
+
+Значения хранятся в pickle, поэтому каталог кэша создаётся с правами
+0700 и не используется, если принадлежит другому пользователю.
+"""
+import os
+import pickle
+import sqlite3
+import stat
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    'name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+)
+STATS = ('hits', 'misses', 'evictions')
+# Не чаще раза в столько секунд обновляем время чтения ключа.
+ACCESS_RESOLUTION = 1.0
+# Через сколько операций счётчики процесса сбрасываются в шард.
+STATS_FLUSH_EVERY = 100
+
+
+def relocate(caches, directory):
+    """Копия ``CACHES``, где шардированные кэши лежат в ``directory``."""
+    relocated = {}
+    for alias, config in caches.items():
+        if config['BACKEND'] == f'{__name__}.{ShardedSQLiteCache.__name__}':
+            config = {**config, 'LOCATION': os.path.join(directory, alias)}
+        relocated[alias] = config
+    return relocated
+
+
+def private_directory(path):
+    """Создаёт каталог с правами 0700 и проверяет, что он наш."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise ImproperlyConfigured(
+            f'Каталог кэша {path} не принадлежит пользователю процесса.')
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+class Shard:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            private_directory(os.path.dirname(self.path))
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self.local.db = db
+        return db
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+            pending = sum(self.stats.values())
+        if pending >= STATS_FLUSH_EVERY:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self.lock:
+            pending, self.stats = self.stats, Counter()
+        if pending:
+            self.db.executemany(
+                'INSERT INTO stats (name, value) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET value = value + ?',
+                [(name, value, value) for name, value in pending.items()]
+            )
+
+
+class ShardedSQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        shards = int(options.get('SHARDS', 8))
+        self._shards = [
+            Shard(os.path.join(location, f'shard-{number}.sqlite3'))
+            for number in range(shards)
+        ]
+        self._shard_entries = max(1, self._max_entries // shards)
+
+    def _shard(self, key):
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _load(self, shard, key, value, accessed, now):
+        if accessed < now - ACCESS_RESOLUTION:
+            shard.db.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        shard = self._shard(key)
+        now = time.time()
+        row = shard.db.execute(
+            'SELECT value, accessed FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, now)
+        ).fetchone()
+        if row is None:
+            shard.count('misses')
+            return default
+        shard.count('hits')
+        return self._load(shard, key, row[0], row[1], now)
+
+    def get_many(self, keys, version=None):
+        by_shard = {}
+        for original in keys:
+            key = self._key(original, version)
+            by_shard.setdefault(self._shard(key), {})[key] = original
+        found = {}
+        now = time.time()
+        for shard, wanted in by_shard.items():
+            rows = shard.db.execute(
+                'SELECT key, value, accessed FROM cache WHERE key IN '
+                f'({", ".join("?" * len(wanted))}) '
+                'AND (expires IS NULL OR expires > ?)', (*wanted, now)
+            ).fetchall()
+            for key, value, accessed in rows:
+                found[wanted[key]] = self._load(
+                    shard, key, value, accessed, now)
+            shard.count('hits', len(rows))
+            shard.count('misses', len(wanted) - len(rows))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        shard = self._shard(key)
+        shard.db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout), time.time())
+        )
+        self._cull(shard)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        shard = self._shard(key)
+        now = time.time()
+        cursor = shard.db.execute(
+            'INSERT INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout), now, now)
+        )
+        if cursor.rowcount:
+            self._cull(shard)
+        return bool(cursor.rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._shard(key).db
+        # IMMEDIATE: между чтением и записью никто не увеличит ключ.
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        cursor = self._shard(key).db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return bool(cursor.rowcount)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._shard(key).db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._shard(key).db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        for shard in self._shards:
+            shard.db.execute('DELETE FROM cache')
+
+    def _cull(self, shard):
+        db = shard.db
+        (entries,) = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if entries <= self._shard_entries:
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),))
+        (entries,) = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if entries <= self._shard_entries:
+            return
+        # Как и в стандартных бэкендах, освобождаем сразу 1/CULL_FREQUENCY.
+        excess = entries - self._shard_entries
+        excess += self._shard_entries // self._cull_frequency
+        cursor = db.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY accessed LIMIT ?)', (excess,))
+        shard.count('evictions', cursor.rowcount)
+
+    def stats(self):
+        """Попадания, промахи и вытеснения по всем процессам."""
+        totals = Counter({name: 0 for name in STATS})
+        for shard in self._shards:
+            shard.flush_stats()
+            totals.update(dict(shard.db.execute(
+                'SELECT name, value FROM stats').fetchall()))
+        totals['entries'] = sum(
+            shard.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            for shard in self._shards
+        )
+        return dict(totals)
@@ -0,0 +1,44 @@
+"""SQLite с настройкой соединения и проверкой постоянных соединений.
+
+Поверх стандартного бэкенда:
+
+* ``PRAGMAS`` из настроек базы выполняются на каждом новом соединении
+  (WAL, ``synchronous``, ``busy_timeout``, ``mmap_size``);
+* при ``CONN_HEALTH_CHECKS`` постоянное соединение (``CONN_MAX_AGE``)
+  проверяется ``SELECT 1`` перед первым запросом в каждом HTTP-запросе
+  и переоткрывается, если перестало работать.
+"""
+from django.db.backends.sqlite3 import base
+from django.db.backends.sqlite3.base import Database
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        self.health_check_done = True
+        return conn
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def _cursor(self, name=None):
+        if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done
+                and self.connection is not None
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        return super()._cursor(name)
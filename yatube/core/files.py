@@ -0,0 +1,220 @@
+"""Отдача статики и медиа без отдельного файлового сервера.
+
+``CompressedManifestStaticFilesStorage`` при collectstatic добавляет к
+именам хэш содержимого и кладёт рядом сжатые копии ``.gz`` (и ``.br``,
+если установлен brotli). ``serve`` выбирает сжатую копию по
+Accept-Encoding, отвечает на Range и If-Modified-Since, а файлам с
+хэшем в имени (статика из манифеста, картинки постов и миниатюры)
+ставит кэширование на год. В режимах ``x-sendfile`` и
+``x-accel-redirect`` (``FILE_SERVING_MODE``) байты отдаёт веб-сервер.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified, StreamingHttpResponse)
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.xml',
+                '.ico', '.map')
+# Сжатая копия, которая экономит меньше 5%, не сохраняется.
+COMPRESSION_MIN_RATIO = 0.95
+# Хэш манифеста (style.0123456789ab.css) или имя-хэш (0123...ef.jpg).
+IMMUTABLE_NAME_RE = re.compile(r'(^|[./])[0-9a-f]{12,}\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+def compress(path):
+    """Пишет рядом с файлом сжатые копии; возвращает их пути."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(data) * COMPRESSION_MIN_RATIO:
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Без записи в манифесте лучше отдать файл без хэша, чем 500.
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if hashed_name:
+                hashed.add(hashed_name)
+        if dry_run:
+            return
+        for name in sorted(hashed):
+            if name.endswith(COMPRESSIBLE):
+                compress(self.path(name))
+
+
+def _accepted(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        name, _, quality = params.strip().partition('=')
+        try:
+            if name.strip() == 'q' and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _negotiate(request, fullpath):
+    """(путь, кодировка, есть ли сжатые копии) для ответа клиенту."""
+    variants = [
+        (encoding, fullpath + suffix) for encoding, suffix in ENCODINGS
+        if os.path.isfile(fullpath + suffix)
+    ]
+    # Range считается по исходным байтам, поэтому отдаём оригинал.
+    if variants and 'HTTP_RANGE' not in request.META:
+        accepted = _accepted(request)
+        for encoding, path in variants:
+            if encoding in accepted:
+                return path, encoding, True
+    return fullpath, None, bool(variants)
+
+
+def parse_range(header, size):
+    """(start, end) включительно, None — отдать весь файл, False — 416.
+
+    Поддерживается один диапазон; несколько или кривой заголовок
+    означают ответ целиком, как разрешает RFC 7233.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _stream(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _cache_control(path):
+    if IMMUTABLE_NAME_RE.search(path):
+        return f'public, max-age={settings.FILE_IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.FILE_MAX_AGE}'
+
+
+def _python_response(request, path, content_type, encoding, last_modified):
+    size = os.path.getsize(path)
+    byte_range = None
+    if encoding is None and request.META.get(
+            'HTTP_IF_RANGE', last_modified) == last_modified:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'))
+        # FileResponse угадывает тип по имени, а у .gz он другой.
+        response['Content-Type'] = content_type
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _stream(open(path, 'rb'), start, end - start + 1),
+            status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    if encoding is None:
+        response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _offloaded_response(request, path, fullpath, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.FILE_SERVING_MODE == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        suffix = path[len(fullpath):]
+        response['X-Accel-Redirect'] = quote(
+            settings.X_ACCEL_REDIRECT_PREFIX + request.path + suffix)
+    return response
+
+
+def serve(request, path, document_root):
+    """Отдаёт файл из ``document_root`` по правилам модуля."""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден')
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+    content_type = mimetypes.guess_type(fullpath)[0]
+    content_type = content_type or 'application/octet-stream'
+    served, encoding, has_variants = _negotiate(request, fullpath)
+    last_modified = http_date(stat.st_mtime)
+    if settings.FILE_SERVING_MODE == 'python':
+        response = _python_response(
+            request, served, content_type, encoding, last_modified)
+    else:
+        response = _offloaded_response(
+            request, served, fullpath, content_type)
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = _cache_control(path)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if has_variants:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def file_patterns(url, document_root):
+    """URL-шаблоны для ``serve`` под префиксом ``url``."""
+    return [
+        re_path(rf'^{re.escape(url.lstrip("/"))}(?P<path>.*)$', serve,
+                {'document_root': document_root}),
+    ]
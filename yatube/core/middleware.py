@@ -0,0 +1,179 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from . import auth, page_cache
+from .routers import RequestRouting, current_routing
+
+logger = logging.getLogger('core.timing')
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """Замеры одного запроса: SQL, шаблоны и общее время."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        # Шаблон или тег -> число рендеров и суммарное время с вложенными.
+        self.template_renders = Counter()
+        self.template_times = Counter()
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+            self.executions[(sql, repr(params))] += 1
+
+    def add_render(self, name, seconds):
+        self.template_renders[name] += 1
+        self.template_times[name] += seconds
+
+    def templates(self):
+        """Шаблоны от самых дорогих: рендеры и миллисекунды."""
+        return {
+            name: {
+                'renders': self.template_renders[name],
+                'ms': round(seconds * 1000, 2),
+            }
+            for name, seconds in self.template_times.most_common()
+        }
+
+    def over_budget(self):
+        """Шаблоны, превысившие бюджет из REQUEST_TIMING_TEMPLATE_BUDGETS."""
+        budgets = settings.REQUEST_TIMING_TEMPLATE_BUDGETS
+        return sorted(
+            name for name, seconds in self.template_times.items()
+            if name in budgets and seconds * 1000 > budgets[name]
+        )
+
+    def duplicates(self):
+        """Одинаковые запросы с одинаковыми параметрами."""
+        return sum(count - 1 for count in self.executions.values())
+
+    def similar(self):
+        """Запросы одной формы, повторённые подозрительно часто (N+1)."""
+        threshold = settings.REQUEST_TIMING_SIMILAR_THRESHOLD
+        return {
+            sql: count for sql, count in self.statements.items()
+            if count >= threshold
+        }
+
+
+class RequestTimingMiddleware:
+    """Пишет Server-Timing и строку лога для выборки запросов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+        self.report(request, response, timings, total)
+        return response
+
+    def report(self, request, response, timings, total):
+        match = getattr(request, 'resolver_match', None)
+        similar = timings.similar()
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} '
+            f'queries"',
+            f'tpl;dur={timings.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(timings.db_time * 1000, 2),
+            'queries': timings.queries,
+            'duplicate_queries': timings.duplicates(),
+            'similar_queries': len(similar),
+            'template_ms': round(timings.template_time * 1000, 2),
+            'templates': timings.templates(),
+        }
+        over_budget = timings.over_budget()
+        if over_budget:
+            record['over_budget'] = over_budget
+        level = logging.WARNING if similar or over_budget else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет за основной базой пользователя, который что-то записал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.REPLICA_PIN_COOKIE
+        routing = RequestRouting(pinned=cookie in request.COOKIES)
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote:
+            response.set_cookie(
+                cookie, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """``request.user`` из кэша вместо запроса к auth_user (core.auth)."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: auth.get_user(request))
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимам готовые страницы из кэша (core.page_cache)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not page_cache.cacheable_request(request):
+            return self.get_response(request)
+        key = page_cache.page_key(request)
+        response = cache.get(key)
+        if response is not None:
+            return page_cache.cached_response(request, response)
+        response = self.get_response(request)
+        if page_cache.cacheable_response(request, response):
+            cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,67 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Ключ складывается из адреса с параметрами, года из контекстного
+процессора ``year`` и версии пути. Запись, затрагивающая страницу,
+увеличивает версию её пути (``invalidate``), и старые копии перестают
+читаться. Попадание не трогает ни ORM, ни сессию: запросы с cookie
+сессии сюда не доходят, а для остальных нужны два чтения из кэша.
+"""
+import hashlib
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import versions
+from .context_processors.year import year
+
+
+def _version_key(path):
+    return f'page-version:{path}'
+
+
+def invalidate(*paths):
+    versions.bump(*(_version_key(path) for path in paths))
+
+
+def page_key(request):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    (version,) = versions.get_many([_version_key(request.path)])
+    return f'page:{year(request)["year"]}:{version}:{url}'
+
+
+def cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    # При попадании view не вызывается, а имя нужно логу замеров.
+    request.resolver_match = match
+    return match.view_name in settings.PAGE_CACHE_VIEWS
+
+
+def cacheable_response(request, response):
+    """Только общие для всех анонимов ответы: без CSRF и своих cookie."""
+    user = getattr(request, 'user', None)
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not (user and user.is_authenticated)
+    )
+
+
+def cached_response(request, response):
+    """Копия из кэша или 304, если у клиента она уже есть."""
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    )
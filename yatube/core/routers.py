@@ -0,0 +1,67 @@
+"""Чтение ленты и профилей с реплик, запись — только в основную базу.
+
+View, помеченные ``@use_replica``, читают со случайной реплики из
+``REPLICA_DATABASES``. Всё остальное, включая чтения внутри view
+с записью, идёт в ``default``. Пользователь, который только что что-то
+записал, на ``REPLICA_PIN_SECONDS`` закрепляется за основной базой
+(cookie ставит ``core.middleware.ReplicaPinMiddleware``), чтобы сразу
+видеть свои изменения несмотря на отставание реплик.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+class RequestRouting:
+    """Состояние маршрутизации одного запроса."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+    def read_database(self):
+        if self.pinned or self.wrote or not self.replica:
+            return PRIMARY
+        return self.replica
+
+
+def use_replica(view):
+    """Разрешает view читать с реплики, если пользователь не закреплён."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        routing = current_routing.get()
+        if routing is None or not settings.REPLICA_DATABASES:
+            return view(request, *args, **kwargs)
+        routing.replica = random.choice(settings.REPLICA_DATABASES)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            routing.replica = None
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None:
+            return PRIMARY
+        return routing.read_database()
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
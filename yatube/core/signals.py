@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import auth
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    auth.bump_version(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, **kwargs):
+    auth.forget_session(request.session.session_key)
@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.template import engines
+from django.template.backends.django import DjangoTemplates, Template
+
+from core.middleware import current_timings
+
+PROFILED_LOADERS = {
+    'django.template.loaders.filesystem.Loader':
+        'core.template.loaders.FilesystemLoader',
+    'django.template.loaders.app_directories.Loader':
+        'core.template.loaders.AppDirectoriesLoader',
+}
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который учитывает время рендеринга
+    в замерах core.middleware.RequestTimingMiddleware.
+
+    Опция ``cached`` (по умолчанию ``not DEBUG``) включает режим
+    продакшена: шаблоны всегда идут через кэширующий загрузчик и
+    прогреваются вызовом ``warm()``. В обоих режимах время пишется
+    ещё и по каждому шаблону, включая ``{% include %}``.
+    """
+
+    def __init__(self, params):
+        params = params.copy()
+        options = params['OPTIONS'] = params.get('OPTIONS', {}).copy()
+        cached = options.pop('cached', not settings.DEBUG)
+        if 'loaders' not in options:
+            loaders = ['django.template.loaders.filesystem.Loader']
+            if params.get('APP_DIRS'):
+                loaders.append(
+                    'django.template.loaders.app_directories.Loader')
+            # Загрузчики заданы явно, а с ними APP_DIRS запрещён.
+            params['APP_DIRS'] = False
+            if cached:
+                options['loaders'] = [
+                    ('core.template.loaders.Loader', loaders)]
+            else:
+                options['loaders'] = [
+                    PROFILED_LOADERS[loader] for loader in loaders]
+        super().__init__(params)
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+    def warm(self):
+        """Разбирает все шаблоны заранее; возвращает их число."""
+        return sum(
+            loader.warm() for loader in self.engine.template_loaders
+            if hasattr(loader, 'warm')
+        )
+
+
+def warm():
+    """Прогревает кэши шаблонов всех шаблонизаторов проекта."""
+    return sum(
+        engine.warm() for engine in engines.all() if hasattr(engine, 'warm')
+    )
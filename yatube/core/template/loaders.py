@@ -0,0 +1,70 @@
+"""Загрузчики шаблонов, чьи шаблоны замеряют собственный рендеринг.
+
+Время пишется по имени шаблона в ``RequestTimings`` текущего запроса,
+поэтому ``{% include %}`` в цикле виден как один шаблон с числом
+рендеров и суммарным временем (вместе с вложенными шаблонами).
+"""
+import os
+import time
+
+from django.template import base
+from django.template.loaders import app_directories, cached, filesystem
+
+from core.middleware import current_timings
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+class ProfiledTemplate(base.Template):
+    def render(self, context):
+        timings = current_timings.get()
+        if timings is None:
+            return super().render(context)
+        started = time.perf_counter()
+        try:
+            return super().render(context)
+        finally:
+            timings.add_render(self.name, time.perf_counter() - started)
+
+
+def _profiled(template):
+    # Шаблон создаёт базовый загрузчик Django, поэтому меняем класс уже
+    # готового объекта: разобранные узлы остаются теми же.
+    if type(template) is base.Template:
+        template.__class__ = ProfiledTemplate
+    return template
+
+
+class ProfiledLoaderMixin:
+    def get_template(self, template_name, skip=None):
+        return _profiled(super().get_template(template_name, skip))
+
+
+class Loader(ProfiledLoaderMixin, cached.Loader):
+    """Кэширующий загрузчик: каждый шаблон читается и разбирается один раз."""
+
+    def warm(self):
+        """Загружает в кэш все шаблоны из каталогов вложенных загрузчиков."""
+        names = set()
+        for loader in self.loaders:
+            for directory in loader.get_dirs():
+                names.update(_template_names(directory))
+        for name in sorted(names):
+            self.get_template(name)
+        return len(names)
+
+
+class FilesystemLoader(ProfiledLoaderMixin, filesystem.Loader):
+    pass
+
+
+class AppDirectoriesLoader(ProfiledLoaderMixin, app_directories.Loader):
+    pass
+
+
+def _template_names(directory):
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith(TEMPLATE_EXTENSIONS):
+                path = os.path.relpath(os.path.join(root, file), directory)
+                yield path.replace(os.sep, '/')
@@ -0,0 +1,24 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .cache import relocate
+
+
+class TestRunner(DiscoverRunner):
+    """Тесты работают со своим кэшем, а не с общим кэшем процессов."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(
+            CACHES=relocate(settings.CACHES, self.cache_dir))
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,499 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import time
+from unittest import mock
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, router
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from posts.models import Comment, Group, Post
+
+from . import files, page_cache, versions
+from .cache import ShardedSQLiteCache
+from .db.backends.sqlite3.base import DatabaseWrapper
+from .middleware import RequestTimings
+from .routers import RequestRouting, current_routing, use_replica
+from .template.backends import TimedDjangoTemplates
+from .template.loaders import ProfiledTemplate
+
+User = get_user_model()
+
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+class RequestTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_and_log_line(self):
+        """Запрос получает Server-Timing и строку лога с замерами."""
+        with self.assertLogs('core.timing', level='INFO') as logs:
+            response = self.client.get('/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_info_lines_reach_a_handler(self):
+        """Настройка LOGGING выводит строки INFO, а не только WARNING."""
+        logger = logging.getLogger('core.timing')
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
+        self.assertTrue(logger.handlers)
+
+    def test_templates_and_includes_are_timed_by_name(self):
+        """В логе время каждого шаблона и include с числом рендеров."""
+        with self.assertLogs('core.timing', level='INFO') as logs:
+            self.client.get('/')
+        templates = json.loads(logs.records[-1].getMessage())['templates']
+        self.assertEqual(templates['posts/index.html']['renders'], 1)
+        self.assertEqual(
+            templates['posts/includes/paginator.html']['renders'], 1)
+        self.assertIn('includes/header.html', templates)
+
+    @override_settings(
+        REQUEST_TIMING_TEMPLATE_BUDGETS={'posts/index.html': 0})
+    def test_template_over_budget_is_a_warning(self):
+        """Шаблон сверх бюджета поднимает строку лога до WARNING."""
+        with self.assertLogs('core.timing', level='INFO') as logs:
+            self.client.get('/')
+        self.assertEqual(logs.records[-1].levelname, 'WARNING')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['over_budget'], ['posts/index.html'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_sampling_can_skip_requests(self):
+        """Запросы вне выборки не замеряются."""
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(REQUEST_TIMING_SIMILAR_THRESHOLD=3)
+    def test_repeated_queries_are_flagged(self):
+        """Повторы и однотипные запросы помечаются как признак N+1."""
+        timings = RequestTimings()
+        with connection.execute_wrapper(timings):
+            with connection.cursor() as cursor:
+                for value in (1, 1, 2):
+                    cursor.execute('SELECT %s', [value])
+        self.assertEqual(timings.queries, 3)
+        self.assertEqual(timings.duplicates(), 1)
+        self.assertEqual(timings.similar(), {'SELECT %s': 3})
+
+
+class TemplateModeTest(TestCase):
+    def engine(self, cached):
+        return TimedDjangoTemplates({
+            'NAME': 'test',
+            'DIRS': [settings.TEMPLATES_DIR],
+            'APP_DIRS': True,
+            'OPTIONS': {'cached': cached},
+        })
+
+    def test_production_mode_parses_templates_once(self):
+        """В режиме продакшена шаблон разбирается один раз."""
+        engine = self.engine(cached=True)
+        first = engine.get_template('posts/index.html').template
+        second = engine.get_template('posts/index.html').template
+        self.assertIs(first, second)
+        self.assertIsInstance(first, ProfiledTemplate)
+
+    def test_warm_loads_every_template(self):
+        """Прогрев разбирает шаблоны проекта и приложений заранее."""
+        engine = self.engine(cached=True)
+        self.assertGreater(engine.warm(), 0)
+        loader = engine.engine.template_loaders[0]
+        names = {key.split('-')[0] for key in loader.get_template_cache}
+        self.assertIn('posts/includes/paginator.html', names)
+        self.assertIn('admin/base.html', names)
+
+    def test_debug_mode_rereads_templates(self):
+        """Без кэша шаблоны читаются заново, но тоже замеряются."""
+        engine = self.engine(cached=False)
+        first = engine.get_template('posts/index.html').template
+        second = engine.get_template('posts/index.html').template
+        self.assertIsNot(first, second)
+        self.assertIsInstance(first, ProfiledTemplate)
+        self.assertEqual(engine.warm(), 0)
+
+
+@override_settings(REPLICA_DATABASES=['replica0'])
+class ReplicaRouterTest(TestCase):
+    def read_database(self, routing):
+        @use_replica
+        def view(request):
+            return router.db_for_read(Post)
+
+        token = current_routing.set(routing)
+        try:
+            return view(RequestFactory().get('/'))
+        finally:
+            current_routing.reset(token)
+
+    def test_replica_views_read_from_replica(self):
+        """View с @use_replica читают с реплики, остальные — с основной."""
+        self.assertEqual(self.read_database(RequestRouting()), 'replica0')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_pinned_user_reads_from_primary(self):
+        """После своей записи пользователь читает из основной базы."""
+        self.assertEqual(
+            self.read_database(RequestRouting(pinned=True)), 'default')
+        routing = RequestRouting()
+        token = current_routing.set(routing)
+        try:
+            router.db_for_write(Post)
+        finally:
+            current_routing.reset(token)
+        self.assertEqual(self.read_database(routing), 'default')
+
+
+class ReplicaPinMiddlewareTest(TestCase):
+    def test_write_sets_pin_cookie(self):
+        """Запись ставит cookie закрепления, чтение — нет."""
+        user = User.objects.create_user(username='writer')
+        self.client.force_login(user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('replica_pin', response.cookies)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertEqual(
+            response.cookies['replica_pin']['max-age'], 5)
+
+
+class SqliteBackendTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        """Каждое соединение получает PRAGMA из настроек базы."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_broken_persistent_connection_is_reopened(self):
+        """Проверка перед первым запросом заменяет мёртвое соединение."""
+        with tempfile.TemporaryDirectory() as workdir:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': os.path.join(workdir, 'health.sqlite3'),
+            }, alias='health')
+            wrapper.ensure_connection()
+            wrapper.connection.close()
+            wrapper.close_if_unusable_or_obsolete()
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                self.assertEqual(cursor.fetchone()[0], 'wal')
+            wrapper.close()
+
+
+class ShardedSQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def make_cache(self, **options):
+        return ShardedSQLiteCache(self.directory.name, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Запись одного процесса сразу видна другому."""
+        first, second = self.make_cache(), self.make_cache()
+        first.set('feed', {'html': 'лента'})
+        self.assertEqual(second.get('feed'), {'html': 'лента'})
+        self.assertFalse(second.add('feed', 'другое'))
+        self.assertTrue(second.add('counter', 1))
+        self.assertEqual(first.incr('counter'), 2)
+        self.assertEqual(first.get_many(['feed', 'counter', 'missing']),
+                         {'feed': {'html': 'лента'}, 'counter': 2})
+        second.delete('feed')
+        self.assertIsNone(first.get('feed'))
+
+    def test_expired_values_are_missing(self):
+        cache = self.make_cache()
+        cache.set('short', 'value', 1)
+        cache.set('forever', 'value', None)
+        self.assertTrue(cache.has_key('short'))
+        self.assertTrue(cache.touch('forever', 1))
+        time.sleep(1.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertFalse(cache.has_key('forever'))
+        self.assertTrue(cache.add('short', 'again'))
+        with self.assertRaises(ValueError):
+            cache.incr('forever')
+
+    def test_least_recently_read_are_evicted(self):
+        """Переполненный шард вытесняет давно не читавшиеся ключи."""
+        cache = self.make_cache(SHARDS=1, MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for number in range(3):
+            cache.set(f'key{number}', number)
+        shard = cache._shards[0]
+        shard.db.execute('UPDATE cache SET accessed = 0')
+        cache.get('key0')
+        cache.set('key3', 3)
+        self.assertEqual(
+            cache.get_many([f'key{number}' for number in range(4)]),
+            {'key0': 0, 'key3': 3})
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['entries'], 2)
+
+    def test_directory_is_private(self):
+        """Каталог создаётся закрытым, чужой каталог не используется."""
+        location = os.path.join(self.directory.name, 'cache')
+        cache = ShardedSQLiteCache(location, {})
+        cache.set('key', 'value')
+        self.assertEqual(os.stat(location).st_mode & 0o777, 0o700)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(ImproperlyConfigured):
+                ShardedSQLiteCache(location, {}).get('key')
+
+
+class CompressedManifestStorageTest(TestCase):
+    def test_hashed_files_get_compressed_copies(self):
+        """collectstatic кладёт рядом с хэшированным CSS его .gz-копию."""
+        with tempfile.TemporaryDirectory() as source, \
+                tempfile.TemporaryDirectory() as target:
+            with open(os.path.join(source, 'style.css'), 'w') as file:
+                file.write('body { margin: 0; }\n' * 100)
+            origin = FileSystemStorage(location=source)
+            storage = files.CompressedManifestStaticFilesStorage(
+                location=target)
+            list(storage.post_process({'style.css': (origin, 'style.css')}))
+            hashed = storage.stored_name('style.css')
+            self.assertRegex(hashed, r'^style\.[0-9a-f]{12}\.css$')
+            with gzip.open(storage.path(hashed) + '.gz', 'rt') as file:
+                self.assertEqual(file.read(), 'body { margin: 0; }\n' * 100)
+
+
+@override_settings(FILE_SERVING_MODE='python')
+class FileServingTest(TestCase):
+    hashed = 'style.0123456789ab.css'
+    content = b'0123456789' * 100
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        for name in ('plain.css', self.hashed):
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(self.content)
+        files.compress(os.path.join(self.root, self.hashed))
+        self.factory = RequestFactory()
+
+    def serve(self, path, **headers):
+        request = self.factory.get('/static/' + path, **headers)
+        return files.serve(request, path, self.root)
+
+    def test_cache_control_depends_on_name(self):
+        """Файлы с хэшем в имени кэшируются навсегда, остальные — на час."""
+        self.assertEqual(
+            self.serve(self.hashed)['Cache-Control'],
+            f'public, max-age={settings.FILE_IMMUTABLE_MAX_AGE}, immutable')
+        self.assertEqual(self.serve('plain.css')['Cache-Control'],
+                         f'public, max-age={settings.FILE_MAX_AGE}')
+
+    def test_precompressed_copy_is_negotiated(self):
+        response = self.serve(self.hashed, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            self.content)
+        response = self.serve(self.hashed, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_range_requests(self):
+        response = self.serve('plain.css', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1000')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        response = self.serve('plain.css', HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), b'56789')
+        response = self.serve('plain.css', HTTP_RANGE='bytes=1000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1000')
+        response = self.serve('plain.css', HTTP_RANGE='bytes=0-1',
+                              HTTP_IF_RANGE='"устаревший"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_and_missing(self):
+        response = self.serve('plain.css')
+        response = self.serve(
+            'plain.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        for path in ('missing.css', '../secret'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.serve(path)
+
+    def test_web_server_modes(self):
+        with override_settings(FILE_SERVING_MODE='x-sendfile'):
+            response = self.serve(self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['X-Sendfile'],
+                             os.path.join(self.root, self.hashed) + '.gz')
+        with override_settings(FILE_SERVING_MODE='x-accel-redirect',
+                               X_ACCEL_REDIRECT_PREFIX='/protected'):
+            response = self.serve('plain.css')
+            self.assertEqual(response['X-Accel-Redirect'],
+                             '/protected/static/plain.css')
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['Content-Type'], 'text/css')
+
+
+class VersionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_changes_only_its_key(self):
+        first, second = versions.get_many(['a', 'b'])
+        self.assertEqual(versions.get_many(['a', 'b']), [first, second])
+        versions.bump('a')
+        self.assertEqual(versions.get_many(['a', 'b']), [first + 1, second])
+
+    def test_lost_version_is_not_reused(self):
+        """После вытеснения версия не возвращается к старому номеру."""
+        (old,) = versions.get_many(['a'])
+        versions.bump('a')
+        cache.delete('a')
+        time.sleep(0.002)
+        self.assertGreater(versions.get_many(['a'])[0], old + 1)
+
+
+class CachedUserTest(TestCase):
+    password = 'Старый-пароль-42'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', password=self.password)
+        self.client.login(username='reader', password=self.password)
+
+    def user_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        return response, [
+            query['sql'] for query in queries.captured_queries
+            if 'auth_user' in query['sql'] or 'django_session' in query['sql']
+        ]
+
+    def test_user_and_session_come_from_cache(self):
+        """Повторный запрос не читает ни сессию, ни пользователя из базы."""
+        url = reverse('posts:post_create')
+        self.user_queries(self.client, url)
+        response, queries = self.user_queries(self.client, url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_password_change_logs_out_other_sessions(self):
+        """После смены пароля другие сессии не пускает и кэш."""
+        other = Client()
+        other.login(username='reader', password=self.password)
+        url = reverse('posts:post_create')
+        self.assertEqual(other.get(url).status_code, 200)
+        response = self.client.post(reverse('users:password_change'), {
+            'old_password': self.password,
+            'new_password1': 'Новый-пароль-42',
+            'new_password2': 'Новый-пароль-42',
+        })
+        self.assertRedirects(response, reverse('users:password_change_done'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(other.get(url).status_code, 302)
+
+    def test_logout_forgets_cached_user(self):
+        url = reverse('posts:post_create')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.get(reverse('users:logout'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_deactivated_user_is_not_served_from_cache(self):
+        url = reverse('posts:post_create')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_deleted_user_is_not_served_from_cache(self):
+        url = reverse('posts:post_create')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            text='Первый пост', author=cls.author, group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[cls.group.slug]),
+            reverse('posts:profile', args=[cls.author.username]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+            reverse('about:author'),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hit_does_not_touch_database(self):
+        """Повторный анонимный запрос отдаётся из кэша без SQL."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                if first.has_header('ETag'):
+                    with self.assertNumQueries(0):
+                        response = self.client.get(
+                            url, HTTP_IF_NONE_MATCH=first['ETag'])
+                    self.assertEqual(response.status_code, 304)
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(self.author)
+        url = reverse('posts:index')
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertContains(response, 'Выйти')
+        self.assertIsNotNone(response.context)
+
+    def test_writes_invalidate_affected_pages(self):
+        """Новый пост сбрасывает свои страницы, комментарий — его страницу."""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(
+            text='Свежий пост', author=self.author, group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий')
+        self.assertContains(
+            self.client.get(self.urls[3]), 'Свежий комментарий')
+
+    def test_page_parameter_is_part_of_key(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        response = self.client.get(url + '?page=2')
+        self.assertIsNotNone(response.context)
+
+    def test_responses_with_csrf_token_are_not_cached(self):
+        request = RequestFactory().get('/')
+        request.META['CSRF_COOKIE_USED'] = True
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(page_cache.cacheable_response(request, response))
@@ -0,0 +1,63 @@
+"""Версии ключей кэша вместо удаления записей.
+
+Версия — число в кэше без срока жизни. Тот, кто кэширует данные,
+добавляет версию в свой ключ, а запись данных увеличивает её
+(``bump``), и старые записи просто перестают читаться. Новая версия
+берётся от текущего времени в миллисекундах, а не с единицы: после
+вытеснения ключа версии старые записи не должны снова стать актуальными.
+
+Рядом с версией ``bump`` запоминает своё время: по нему условные GET
+отдают Last-Modified, который сдвигается при любом изменении, включая
+удаление и правку.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def _modified_key(key):
+    return f'{key}:modified'
+
+
+def get_many(keys, found=None):
+    """Версии ключей ``keys`` в том же порядке; недостающие заводятся.
+
+    ``found`` — уже прочитанные значения, если версии достали из кэша
+    вместе с другими ключами.
+    """
+    if found is None:
+        found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def get_state(keys):
+    """Версии ключей и время последнего ``bump`` любого из них.
+
+    Если отметка времени потерялась, ею становится текущее время:
+    лишний полный ответ лучше, чем 304 на изменившуюся страницу.
+    """
+    stamps = [_modified_key(key) for key in keys]
+    found = cache.get_many([*keys, *stamps])
+    for stamp in stamps:
+        if stamp not in found:
+            cache.add(stamp, time.time(), None)
+            found[stamp] = cache.get(stamp)
+    return get_many(keys, found), max(found[stamp] for stamp in stamps)
+
+
+def bump(*keys):
+    now = time.time()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+        cache.set(_modified_key(key), now, None)
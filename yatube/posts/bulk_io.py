@@ -0,0 +1,286 @@
+"""Потоковые выгрузка и загрузка данных yatube (JSON Lines и CSV).
+
+Записи читаются и пишутся генераторами, поэтому память не зависит от
+объёма данных: выгрузка идёт через ``iterator(chunk_size=...)``, загрузка —
+через ``bulk_create`` порциями, каждая в своей транзакции. Пользователи
+и группы связываются по ``username`` и ``slug``, посты и комментарии
+сохраняют свои id, чтобы комментарии находили свои посты.
+"""
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+
+
+class Spec:
+    def __init__(self, model, fields, refs=None, dates=(), ints=()):
+        self.model = model
+        # Имя колонки в файле -> путь для values().
+        self.fields = fields
+        # Колонка-ссылка -> ('user' | 'group', поле модели, обязательна ли).
+        self.refs = refs or {}
+        self.dates = dates
+        self.ints = ints
+
+
+SPECS = {
+    'users': Spec(User, {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email',
+        'password': 'password',
+        'is_active': 'is_active',
+        'date_joined': 'date_joined',
+    }, dates=('date_joined',)),
+    'groups': Spec(Group, {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }),
+    'posts': Spec(Post, {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }, refs={
+        'author': ('user', 'author_id', True),
+        'group': ('group', 'group_id', False),
+    },
+        dates=('pub_date',), ints=('id',)),
+    'comments': Spec(Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }, refs={'author': ('user', 'author_id', True)},
+        dates=('created',), ints=('id', 'post')),
+    'follows': Spec(Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }, refs={
+        'user': ('user', 'user_id', True),
+        'author': ('user', 'author_id', True),
+    }),
+}
+
+
+class Touched:
+    """Авторы, группы, посты и подписчики, чьи страницы задела загрузка.
+
+    ``bulk_create`` не шлёт сигналов, поэтому кэши по ним сбрасывает
+    сама команда. У новых постов своих страниц в кэше ещё нет, так что
+    посты собираются только по комментариям.
+    """
+
+    def __init__(self):
+        self.authors = set()
+        self.groups = set()
+        self.posts = set()
+        self.followers = set()
+
+    def add(self, model, rows):
+        for row in rows:
+            if model is Post:
+                self.authors.add(row['author_id'])
+                if row.get('group_id'):
+                    self.groups.add(row['group_id'])
+            elif model is Comment:
+                self.posts.add(row['post_id'])
+            elif model is Follow:
+                self.followers.add(row['user_id'])
+
+
+class Throughput:
+    """Считает обработанные строки и скорость."""
+
+    def __init__(self, report):
+        self.report = report
+        self.rows = 0
+        self.started = time.monotonic()
+
+    def add(self, rows):
+        self.rows += rows
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        self.report(self.rows, self.rows / elapsed)
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def export_rows(name, chunk_size):
+    spec = SPECS[name]
+    columns = list(spec.fields)
+    rows = spec.model.objects.order_by('pk').values_list(
+        *spec.fields.values()).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dict(zip(columns, row))
+
+
+def write_rows(rows, stream, fmt, columns, progress, every):
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=columns)
+        writer.writeheader()
+    written = 0
+    for row in rows:
+        if writer:
+            writer.writerow({
+                key: _json_default(value) if hasattr(value, 'isoformat')
+                else value
+                for key, value in row.items()
+            })
+        else:
+            # Одной записью: OutputWrapper команды сам дописывает перевод
+            # строки к каждому write без него.
+            stream.write(json.dumps(
+                row, ensure_ascii=False, default=_json_default) + '\n')
+        written += 1
+        if written == every:
+            progress.add(written)
+            written = 0
+    if written:
+        progress.add(written)
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _blank_to_none(spec, row):
+    # В CSV пустая строка означает «нет значения» только у ссылок, дат
+    # и чисел: текстовые поля пользователя и группы NOT NULL.
+    for key in (*spec.refs, *spec.dates, *spec.ints):
+        if row.get(key) == '':
+            row[key] = None
+
+
+def _coerce(spec, row):
+    for key in spec.dates:
+        if isinstance(row.get(key), str):
+            row[key] = parse_datetime(row[key])
+        if row.get(key) is None:
+            row[key] = timezone.now()
+    for key in spec.ints:
+        if row.get(key) is not None:
+            row[key] = int(row[key])
+    if isinstance(row.get('is_active'), str):
+        row['is_active'] = row['is_active'].lower() in ('1', 'true')
+
+
+def _clean(spec, row):
+    row = {key: value for key, value in row.items() if key in spec.fields}
+    _blank_to_none(spec, row)
+    _coerce(spec, row)
+    for column, source in spec.fields.items():
+        if column not in spec.refs and source != column and column in row:
+            row[source] = row.pop(column)
+    return row
+
+
+def _resolve(spec, rows):
+    """Переводит username/slug порции в id одним запросом на модель."""
+    wanted = {'user': set(), 'group': set()}
+    for row in rows:
+        for column, (kind, _, _) in spec.refs.items():
+            if row.get(column):
+                wanted[kind].add(row[column])
+    found = {
+        'user': dict(User.objects.filter(
+            username__in=wanted['user']).values_list('username', 'pk')),
+        'group': dict(Group.objects.filter(
+            slug__in=wanted['group']).values_list('slug', 'pk')),
+    }
+    resolved = []
+    for row in rows:
+        for column, (kind, field, required) in spec.refs.items():
+            value = row.pop(column, None)
+            row[field] = found[kind].get(value) if value else None
+            if required and row[field] is None:
+                break
+        else:
+            resolved.append(row)
+    if spec.model is Comment:
+        posts = set(Post.objects.filter(pk__in={
+            row['post_id'] for row in resolved if row.get('post_id')
+        }).values_list('pk', flat=True))
+        resolved = [row for row in resolved if row.get('post_id') in posts]
+    return resolved
+
+
+@contextmanager
+def keep_auto_dates(model):
+    """Не даёт auto_now_add затереть даты из файла при bulk_create."""
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def copy_image(name, media_source):
+    if not name or default_storage.exists(name):
+        return
+    source = os.path.join(media_source, name)
+    if os.path.exists(source):
+        with open(source, 'rb') as image:
+            default_storage.save(name, image)
+
+
+def import_rows(name, rows, batch_size, progress, media_source=None,
+                touched=None):
+    """Загружает записи порциями; возвращает число пропущенных строк
+    со ссылками на несуществующих пользователей, группы или посты.
+
+    В ``touched`` (``Touched``) собираются id, чьи кэши надо сбросить.
+    """
+    spec = SPECS[name]
+    rows = iter(rows)
+    skipped = 0
+    with keep_auto_dates(spec.model):
+        while True:
+            batch = [_clean(spec, row) for row in islice(rows, batch_size)]
+            if not batch:
+                return skipped
+            resolved = _resolve(spec, batch)
+            skipped += len(batch) - len(resolved)
+            if media_source:
+                for row in resolved:
+                    copy_image(row.get('image'), media_source)
+            with transaction.atomic():
+                spec.model.objects.bulk_create(
+                    [spec.model(**row) for row in resolved],
+                    ignore_conflicts=True
+                )
+            if touched is not None:
+                touched.add(spec.model, resolved)
+            progress.add(len(batch))
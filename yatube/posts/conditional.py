@@ -0,0 +1,87 @@
+"""Условные GET (ETag и Last-Modified) для лент и страницы поста.
+
+Оба валидатора берутся из версий областей ``posts.feed_cache``: ETag —
+из самих версий, пользователя и параметров запроса (для вошедшего — ещё и
+CSRF-токена, который попадает в форму комментария), Last-Modified — из
+времени последнего изменения любой области. Поэтому удаление и правка
+поста сдвигают и его. Для view нужен разве что лёгкий запрос по индексу,
+чтобы узнать области, и на 304 не тратятся ни шаблоны, ни выборка постов.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Group, Post, User
+
+
+def _validators(request, scopes):
+    # etag_func и last_modified_func вызываются по отдельности, а запрос
+    # к базе и чтение из кэша нужны одни.
+    if not hasattr(request, '_conditional_validators'):
+        scopes = scopes()
+        request._conditional_validators = (
+            _compute_validators(request, scopes) if scopes else (None, None))
+    return request._conditional_validators
+
+
+def _compute_validators(request, scopes):
+    parts = [request.path, request.GET.urlencode()]
+    if request.user.is_authenticated:
+        # Вход заново меняет токен: страница с формой не должна
+        # отдаваться из кэша браузера со старым. Сам get_token каждый раз
+        # солит токен по-новому, поэтому в ETag идёт значение из cookie.
+        get_token(request)
+        parts += [f'user={request.user.pk}',
+                  f"csrf={request.META['CSRF_COOKIE']}"]
+        scopes = [*scopes, f'follow:{request.user.pk}']
+    versions, modified = feed_cache.get_state(*scopes)
+    parts += [
+        f'{scope}={version}' for scope, version in zip(scopes, versions)
+    ]
+    return (hashlib.md5('|'.join(parts).encode()).hexdigest(),
+            datetime.fromtimestamp(modified, timezone.utc))
+
+
+def _index_scopes():
+    return ['posts']
+
+
+def _group_scopes(slug):
+    pk = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    return pk and [f'group:{pk}']
+
+
+def _profile_scopes(username):
+    pk = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return pk and [f'author:{pk}']
+
+
+def _post_scopes(post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    return author_id and [f'post:{post_id}', f'author:{author_id}']
+
+
+def conditional(scopes):
+    """``condition`` с валидаторами по областям, которые вернул ``scopes``.
+
+    Если объекта нет, валидаторов тоже нет, и view сам отдаёт 404.
+    """
+    def etag(request, *args, **kwargs):
+        return _validators(request, lambda: scopes(*args, **kwargs))[0]
+
+    def last_modified(request, *args, **kwargs):
+        return _validators(request, lambda: scopes(*args, **kwargs))[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+index = conditional(_index_scopes)
+group_posts = conditional(_group_scopes)
+profile = conditional(_profile_scopes)
+post_detail = conditional(_post_scopes)
@@ -0,0 +1,81 @@
+"""Денормализованные счётчики постов автора и группы."""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Group, Post, Profile
+
+User = get_user_model()
+
+
+def _change(queryset, delta):
+    if delta < 0:
+        queryset = queryset.filter(posts_count__gte=-delta)
+    return queryset.update(posts_count=F('posts_count') + delta)
+
+
+def change_author_count(author_id, delta):
+    if _change(Profile.objects.filter(user_id=author_id), delta):
+        return
+    if delta < 0:
+        return
+    # Первый пост автора: заводим профиль с точным значением.
+    try:
+        with transaction.atomic():
+            Profile.objects.create(
+                user_id=author_id,
+                posts_count=Post.objects.filter(author_id=author_id).count()
+            )
+    except IntegrityError:
+        _change(Profile.objects.filter(user_id=author_id), delta)
+
+
+def change_group_count(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(pk=group_id), delta)
+
+
+def count_created_posts(posts):
+    """Учитывает посты, созданные через bulk_create (без сигналов)."""
+    authors = Counter(post.author_id for post in posts)
+    groups = Counter(post.group_id for post in posts if post.group_id)
+    for author_id, delta in authors.items():
+        change_author_count(author_id, delta)
+    for group_id, delta in groups.items():
+        change_group_count(group_id, delta)
+
+
+def author_posts_count(author):
+    try:
+        return author.profile.posts_count
+    except Profile.DoesNotExist:
+        return 0
+
+
+def _posts_count(field, outer='pk'):
+    posts = Post.objects.filter(**{field: OuterRef(outer)}).order_by()
+    posts = posts.values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(posts), 0)
+
+
+def recount(author_ids=None, group_ids=None):
+    """Пересчитывает счётчики по таблице постов: все или только у
+    авторов ``author_ids`` и групп ``group_ids``."""
+    missing = User.objects.filter(posts__isnull=False, profile__isnull=True)
+    profiles = Profile.objects.all()
+    groups = Group.objects.all()
+    if author_ids is not None:
+        missing = missing.filter(pk__in=author_ids)
+        profiles = profiles.filter(user_id__in=author_ids)
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id)
+         for user_id in missing.distinct().values_list('pk', flat=True)],
+        ignore_conflicts=True
+    )
+    profiles.update(posts_count=_posts_count('author', 'user_id'))
+    groups.update(posts_count=_posts_count('group'))
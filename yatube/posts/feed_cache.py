@@ -0,0 +1,110 @@
+"""Кэш фрагментов лент с версиями вместо короткого времени жизни.
+
+Ключ фрагмента собирается из имени ленты, параметров страницы и версий
+областей (``posts``, ``group:<id>``, ``author:<id>``, ``follow:<user_id>``,
+``post:<id>``). Запись поста, комментария или подписки увеличивает версию
+затронутых областей, и старые фрагменты просто перестают читаться.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.urls import NoReverseMatch, reverse
+
+from core import page_cache, versions
+
+FeedCache = namedtuple('FeedCache', 'key timeout')
+
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+def _version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def get_versions(*scopes):
+    return versions.get_many([_version_key(scope) for scope in scopes])
+
+
+def get_state(*scopes):
+    """Версии областей и время последнего изменения любой из них."""
+    return versions.get_state([_version_key(scope) for scope in scopes])
+
+
+def bump(*scopes):
+    versions.bump(*(_version_key(scope) for scope in scopes))
+
+
+def post_scopes(post):
+    """Области, которые затрагивает запись поста."""
+    scopes = {'posts', f'post:{post.pk}', f'author:{post.author_id}'}
+    if post.group_id:
+        scopes.add(f'group:{post.group_id}')
+    previous = getattr(post, '_previous_owner', None)
+    if previous:
+        author_id, group_id = previous
+        scopes.add(f'author:{author_id}')
+        if group_id:
+            scopes.add(f'group:{group_id}')
+    return scopes
+
+
+def group_path(slug):
+    """Адрес группы или None, если слаг не подходит для адреса."""
+    try:
+        return reverse('posts:group_list', args=[slug])
+    except NoReverseMatch:
+        return None
+
+
+def _paths(author_ids, group_ids, post_ids):
+    from .models import Group, User
+
+    paths = {reverse('posts:index')}
+    paths.update(
+        reverse('posts:post_detail', args=[post_id]) for post_id in post_ids)
+    paths.update(
+        reverse('posts:profile', args=[username])
+        for username in User.objects.filter(
+            pk__in=author_ids).values_list('username', flat=True)
+    )
+    paths.update(
+        group_path(slug)
+        for slug in Group.objects.filter(
+            pk__in=set(group_ids) - {None}).values_list('slug', flat=True)
+    )
+    return paths - {None}
+
+
+def post_paths(post):
+    """Адреса страниц с постом для кэша страниц (core.page_cache)."""
+    authors, groups = {post.author_id}, {post.group_id}
+    previous = getattr(post, '_previous_owner', None)
+    if previous:
+        authors.add(previous[0])
+        groups.add(previous[1])
+    return _paths(authors, groups, [post.pk])
+
+
+def invalidate(authors=(), groups=(), posts=(), followers=()):
+    """Сбрасывает ленты и страницы после записи мимо сигналов
+    (``bulk_create`` в import_data): авторов, групп, постов и лент
+    подписок с этими id."""
+    bump(
+        'posts',
+        *(f'author:{pk}' for pk in authors),
+        *(f'group:{pk}' for pk in groups),
+        *(f'post:{pk}' for pk in posts),
+        *(f'follow:{pk}' for pk in followers),
+    )
+    page_cache.invalidate(*_paths(authors, groups, posts))
+
+
+def feed_cache(request, feed, *scopes):
+    """Ключ и время жизни фрагмента ленты для тега ``{% cache %}``."""
+    parts = [feed]
+    parts += [request.GET.get(param, '') for param in PAGE_PARAMS]
+    parts += [
+        f'{scope}={version}'
+        for scope, version in zip(scopes, get_versions(*scopes))
+    ]
+    return FeedCache(':'.join(parts), settings.FEED_CACHE_TIMEOUT)
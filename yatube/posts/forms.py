@@ -1,5 +1,6 @@
 from django import forms
 from .models import Post, Comment
+from . import uploads
 
 
 class PostForm(forms.ModelForm):
@@ -9,6 +10,9 @@ class PostForm(forms.ModelForm):
         help_texts = {'group': 'Выберите группу', 'text': 'Введите ссообщение'}
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        return uploads.process(self.cleaned_data['image'])
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
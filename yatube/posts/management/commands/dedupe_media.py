@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import references
+
+
+class Command(BaseCommand):
+    help = ('Переименовывает картинки постов в хэш содержимого, удаляет '
+            'дубли и пересчитывает ссылки на файлы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Удалить и картинки, на которые не ссылается ни один пост.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        stats = references.dedupe(options['prune'], options['dry_run'])
+        self.stdout.write(
+            f'Файлов: {stats["files"]}, дублей: {stats["duplicates"]}, '
+            f'переименовано: {stats["renamed"]}, '
+            f'без ссылок: {stats["pruned"]}, '
+            f'освобождено: {stats["freed"] / 2 ** 20:.1f} МБ')
+        if options['dry_run']:
+            self.stdout.write('Пробный запуск: файлы не изменены')
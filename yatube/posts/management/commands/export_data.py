@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk_io
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает пользователей, группы, посты, комментарии '
+            'или подписки в JSON Lines/CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(bulk_io.SPECS))
+        parser.add_argument('--format', choices=bulk_io.FORMATS,
+                            default='jsonl')
+        parser.add_argument('--output', default='-',
+                            help='Файл для записи, «-» — stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        name = options['model']
+        progress = bulk_io.Throughput(self.report)
+        rows = bulk_io.export_rows(name, options['chunk_size'])
+        columns = list(bulk_io.SPECS[name].fields)
+        if options['output'] == '-':
+            bulk_io.write_rows(rows, self.stdout, options['format'], columns,
+                               progress, options['chunk_size'])
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            bulk_io.write_rows(rows, output, options['format'], columns,
+                               progress, options['chunk_size'])
+
+    def report(self, rows, rate):
+        self.stderr.write(f'Выгружено строк: {rows} ({rate:.0f} строк/с)')
@@ -0,0 +1,53 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import bulk_io, counters, feed_cache, references
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает пользователей, группы, посты, комментарии '
+            'или подписки из JSON Lines/CSV порциями через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(bulk_io.SPECS))
+        parser.add_argument('path', help='Файл для чтения, «-» — stdin.')
+        parser.add_argument('--format', choices=bulk_io.FORMATS,
+                            default='jsonl')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--media-source',
+            help='Каталог MEDIA_ROOT источника: картинки постов будут '
+                 'скопированы в хранилище, если их там ещё нет.')
+
+    def handle(self, *args, **options):
+        name = options['model']
+        progress = bulk_io.Throughput(self.report)
+        touched = bulk_io.Touched()
+        if options['path'] == '-':
+            skipped = self.load(sys.stdin, options, progress, touched)
+        else:
+            with open(options['path'], encoding='utf-8',
+                      newline='') as source:
+                skipped = self.load(source, options, progress, touched)
+        if name == 'posts':
+            counters.recount()
+            references.recount()
+        feed_cache.invalidate(touched.authors, touched.groups,
+                              touched.posts, touched.followers)
+        self.stdout.write(
+            f'Загружено строк: {progress.rows - skipped}, '
+            f'пропущено: {skipped}')
+        if name in ('posts', 'follows') and settings.TIMELINE_FANOUT:
+            self.stdout.write(
+                'Запустите rebuild_timelines, чтобы обновить ленты подписок')
+
+    def load(self, stream, options, progress, touched):
+        rows = bulk_io.read_rows(stream, options['format'])
+        return bulk_io.import_rows(
+            options['model'], rows, options['batch_size'], progress,
+            options['media_source'], touched)
+
+    def report(self, rows, rate):
+        self.stderr.write(f'Прочитано строк: {rows} ({rate:.0f} строк/с)')
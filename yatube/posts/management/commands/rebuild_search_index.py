@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Переиндексирует посты для полнотекстового поиска порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        def progress(indexed):
+            self.stdout.write(f'Проиндексировано постов: {indexed}')
+
+        search.rebuild(options['batch_size'], progress)
+        self.stdout.write('Поисковый индекс пересобран')
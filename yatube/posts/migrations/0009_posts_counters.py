@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Profile = apps.get_model('posts', 'Profile')
+
+    def posts_count(field, outer):
+        posts = Post.objects.filter(**{field: OuterRef(outer)}).order_by()
+        posts = posts.values(field).annotate(total=Count('pk'))
+        return Coalesce(Subquery(posts.values('total')), 0)
+
+    authors = Post.objects.order_by().values_list(
+        'author_id', flat=True).distinct()
+    Profile.objects.bulk_create(
+        [Profile(user_id=author_id) for author_id in authors])
+    Profile.objects.update(posts_count=posts_count('author', 'user_id'))
+    Group.objects.update(posts_count=posts_count('group', 'pk'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
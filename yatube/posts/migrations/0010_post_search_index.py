@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from posts.search import create_index
+    create_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    from posts.search import drop_index
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_posts_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:33
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_pub_dates(apps, schema_editor):
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry.objects.update(pub_date=Subquery(
+        Post.objects.filter(pk=OuterRef('post')).values('pub_date')[:1]
+    ))
+
+
+def fill_celebrities(apps, schema_editor):
+    TimelineCelebrity = apps.get_model('posts', 'TimelineCelebrity')
+    Follow = apps.get_model('posts', 'Follow')
+    authors = Follow.objects.order_by().values('author').annotate(
+        total=Count('pk')
+    ).filter(total__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+    TimelineCelebrity.objects.bulk_create([
+        TimelineCelebrity(author_id=row['author']) for row in authors
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_image_references'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_pub_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.CreateModel(
+            name='TimelineCelebrity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_celebrity', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_celebrities, migrations.RunPython.noop),
+    ]
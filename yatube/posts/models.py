@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage
+
 User = get_user_model()
 
 
@@ -8,11 +10,34 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+        from .counters import count_created_posts, recount
+        from .search import index_post
+
+        objs = super().bulk_create(objs, batch_size, ignore_conflicts)
+        # SQLite не возвращает id из bulk_create: такие посты попадут
+        # в поиск после команды rebuild_search_index.
+        indexed = [post for post in objs if post.pk]
+        if ignore_conflicts:
+            # Пропущенные строки не отличить от вставленных: счётчики
+            # считаются заново по таблице, а в поиск идёт текст из базы.
+            recount({post.author_id for post in objs},
+                    {post.group_id for post in objs if post.group_id})
+            indexed = self.filter(pk__in=[post.pk for post in indexed])
+        else:
+            count_created_posts(objs)
+        for post in indexed:
+            index_post(post)
+        return objs
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -29,14 +54,24 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=image_storage,
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.text
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='post_group_pub_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -53,6 +88,13 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -61,5 +103,56 @@ class Follow(models.Model):
         User, on_delete=models.CASCADE, related_name='following')
 
     class Meta:
-        models.UniqueConstraint(fields=['user', 'author'],
-                                name='unique_followers')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_followers')
+        ]
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='profile')
+    posts_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.user.username
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Копия даты поста: лента листается по индексу без сортировки.
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+
+class TimelineCelebrity(models.Model):
+    """Автор, чьи посты читаются при просмотре ленты, а не раскладываются
+    по лентам подписчиков (posts.timeline)."""
+
+    author = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='timeline_celebrity')
+
+    def __str__(self):
+        return self.author.username
+
+
+class ImageReference(models.Model):
+    """Сколько постов ссылается на файл картинки (posts.references)."""
+
+    name = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,168 @@
+"""Счётчики ссылок постов на файлы картинок.
+
+Один файл ``posts.storage`` может принадлежать многим постам; файл и
+его миниатюры удаляются, только когда уходит последняя ссылка.
+``dedupe`` приводит к тому же виду картинки, сохранённые до появления
+хранилища или загруженные в обход него.
+"""
+import logging
+import os
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core import page_cache
+
+from . import feed_cache
+from .models import ImageReference, Post
+from .storage import content_hash, content_name, image_storage
+
+logger = logging.getLogger(__name__)
+
+
+def acquire(name):
+    if not name:
+        return
+    references = ImageReference.objects.filter(name=name)
+    if references.update(count=F('count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ImageReference.objects.create(name=name, count=1)
+    except IntegrityError:
+        references.update(count=F('count') + 1)
+
+
+def acquire_upload(image):
+    """Берёт ссылку на файл, под которым сохранится новая загрузка.
+
+    Вызывается до сохранения: если те же байты уже лежат на диске,
+    хранилище переиспользует файл, и ссылка должна появиться раньше,
+    чем ``delete_file`` последнего старого поста решит его стереть.
+    """
+    name = image_storage.name_for(
+        image.field.generate_filename(image.instance, image.name),
+        image.file)
+    acquire(name)
+    return name
+
+
+def release(name):
+    if not name:
+        return
+    ImageReference.objects.filter(
+        name=name, count__gt=0).update(count=F('count') - 1)
+    if ImageReference.objects.filter(name=name, count=0).exists():
+        transaction.on_commit(lambda: delete_file(name))
+
+
+def delete_file(name):
+    """Удаляет файл и его миниатюры, если на него снова не сослались.
+
+    Пустая запись счётчика удаляется в одной транзакции с файлом:
+    ``acquire`` тех же байтов либо успевает поднять счётчик, и файл
+    остаётся, либо ждёт конца транзакции и сохраняет файл заново.
+    """
+    try:
+        with transaction.atomic():
+            deleted, _ = ImageReference.objects.filter(
+                name=name, count=0).delete()
+            if deleted:
+                default.kvstore.delete(ImageFile(name, image_storage))
+                image_storage.delete(name)
+    except Exception:
+        # Пост уже удалён, осиротевший файл соберёт dedupe_media --prune.
+        logger.exception('Не удалось удалить картинку %s', name)
+
+
+def recount():
+    """Пересчитывает ссылки по таблице постов."""
+    counts = Post.objects.exclude(image='').order_by().values(
+        'image').annotate(total=Count('pk'))
+    with transaction.atomic():
+        ImageReference.objects.all().delete()
+        ImageReference.objects.bulk_create([
+            ImageReference(name=row['image'], count=row['total'])
+            for row in counts
+        ])
+
+
+def _group_by_content(upload_to):
+    groups = defaultdict(list)
+    root = image_storage.path(upload_to)
+    for directory, _, files in os.walk(root):
+        for file in files:
+            if file.endswith('.part'):
+                continue
+            name = os.path.relpath(
+                os.path.join(directory, file), image_storage.location)
+            name = name.replace(os.sep, '/')
+            with image_storage.open(name) as content:
+                digest = content_hash(content)
+            groups[content_name(upload_to + file, digest)].append(name)
+    return groups
+
+
+def _move_posts(name, canonical):
+    posts = list(Post.objects.filter(image=name).only(
+        'pk', 'author_id', 'group_id'))
+    Post.objects.filter(image=name).update(image=canonical)
+    for post in posts:
+        feed_cache.bump(*feed_cache.post_scopes(post))
+        page_cache.invalidate(*feed_cache.post_paths(post))
+
+
+def _remove(name):
+    default.kvstore.delete(ImageFile(name, image_storage))
+    if image_storage.exists(name):
+        image_storage.delete(name)
+
+
+def _prune(names, size, stats, dry_run):
+    stats['pruned'] += len(names)
+    stats['freed'] += size * len(names)
+    if not dry_run:
+        for name in names:
+            _remove(name)
+
+
+def _merge(canonical, names, size, stats, dry_run):
+    stats['duplicates'] += len(names) - 1
+    stats['freed'] += size * (len(names) - 1)
+    if canonical not in names:
+        stats['renamed'] += 1
+    if dry_run:
+        return
+    if canonical not in names:
+        os.replace(image_storage.path(names[0]),
+                   image_storage.path(canonical))
+    for name in names:
+        if name != canonical:
+            _move_posts(name, canonical)
+            _remove(name)
+
+
+def dedupe(prune=False, dry_run=False):
+    """Переименовывает картинки в хэш содержимого и склеивает дубли.
+
+    Посты переводятся на оставшийся файл, счётчики ссылок
+    пересчитываются. С ``prune`` удаляются и файлы без постов.
+    Возвращает статистику по файлам и освобождённым байтам.
+    """
+    upload_to = Post._meta.get_field('image').upload_to
+    groups = _group_by_content(upload_to)
+    referenced = set(Post.objects.exclude(image='').values_list(
+        'image', flat=True).distinct())
+    stats = Counter(files=sum(len(names) for names in groups.values()))
+    for canonical, names in sorted(groups.items()):
+        size = image_storage.size(names[0])
+        if prune and referenced.isdisjoint(names):
+            _prune(names, size, stats, dry_run)
+        else:
+            _merge(canonical, names, size, stats, dry_run)
+    if not dry_run:
+        recount()
+    return stats
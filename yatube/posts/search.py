@@ -0,0 +1,152 @@
+"""Полнотекстовый поиск по постам.
+
+В SQLite используется виртуальная таблица FTS5 ``posts_post_fts`` (rowid
+совпадает с id поста), в PostgreSQL — GIN-индекс по ``to_tsvector``.
+На остальных СУБД поиск деградирует до ``icontains``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+# Чем свежее пост, тем больше прибавка к релевантности.
+SQLITE_RANK = (
+    f'-bm25({FTS_TABLE}) + %s / '
+    "(1 + julianday('now') - julianday(posts_post.pub_date))"
+)
+POSTGRES_RECENCY = (
+    '%s / (1 + EXTRACT(EPOCH FROM (NOW() - posts_post.pub_date)) / 86400)'
+)
+
+
+def _vendor(using=None):
+    return (using or connection).vendor
+
+
+def create_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS posts_post_text_search ON posts_post '
+            "USING GIN (to_tsvector(%s::regconfig, COALESCE(text, '')))",
+            [settings.SEARCH_POSTGRES_CONFIG]
+        )
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS posts_post_text_search')
+
+
+def index_post(post):
+    if _vendor() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def unindex_post(post):
+    if _vendor() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+
+
+def rebuild(batch_size, progress=None):
+    """Переиндексирует все посты порциями по ``batch_size``.
+
+    Индекс не очищается целиком: каждая порция id заменяется на месте
+    вместе с удалением строк исчезнувших постов, поэтому во время
+    переиндексации поиск продолжает находить всё.
+    """
+    if _vendor() == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('REINDEX INDEX posts_post_text_search')
+        return
+    if _vendor() != 'sqlite':
+        return
+    last_id, indexed = 0, 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM posts_post '
+                'WHERE id > %s ORDER BY id LIMIT %s)',
+                [last_id, batch_size]
+            )
+            batch_last, batch_count = cursor.fetchone()
+            if not batch_count:
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid > %s', [last_id])
+                return
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid > %s AND rowid <= %s '
+                'AND rowid NOT IN (SELECT id FROM posts_post '
+                'WHERE id > %s AND id <= %s)',
+                [last_id, batch_last, last_id, batch_last]
+            )
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, text) '
+                'SELECT id, text FROM posts_post WHERE id > %s AND id <= %s',
+                [last_id, batch_last]
+            )
+        last_id = batch_last
+        indexed += batch_count
+        if progress:
+            progress(indexed)
+
+
+def match_expression(query):
+    """Превращает пользовательский ввод в безопасный запрос FTS5."""
+    return ' '.join(f'"{token}"' for token in TOKEN_RE.findall(query))
+
+
+def search_posts(queryset, query):
+    """Посты, подходящие под запрос, от самых релевантных и свежих."""
+    tokens = TOKEN_RE.findall(query)
+    if not tokens:
+        return queryset.none()
+    weight = settings.SEARCH_RECENCY_WEIGHT
+    vendor = _vendor()
+    if vendor == 'sqlite':
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = posts_post.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match_expression(query)],
+            select={'search_rank': SQLITE_RANK},
+            select_params=[weight],
+        ).order_by('-search_rank', '-pub_date')
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVector)
+
+        config = settings.SEARCH_POSTGRES_CONFIG
+        vector = SearchVector('text', config=config)
+        search_query = SearchQuery(' '.join(tokens), config=config)
+        return queryset.annotate(
+            search=vector,
+            search_rank=SearchRank(vector, search_query)
+            + RawSQL(POSTGRES_RECENCY, [weight]),
+        ).filter(search=search_query).order_by('-search_rank', '-pub_date')
+    for token in tokens:
+        queryset = queryset.filter(text__icontains=token)
+    return queryset.order_by('-pub_date')
@@ -0,0 +1,144 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core import page_cache
+
+from . import (counters, feed_cache, references, search, thumbnails,
+               timeline)
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created and timeline.is_enabled():
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and timeline.is_enabled():
+        timeline.backfill(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    if timeline.is_enabled():
+        timeline.prune(instance.user, instance.author)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, raw=False, **kwargs):
+    instance._previous_owner = None
+    instance._previous_image = None
+    if instance.pk and not raw:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'author_id', 'group_id', 'image').first()
+        if previous:
+            instance._previous_owner = previous[:2]
+            instance._previous_image = previous[2]
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.change_author_count(instance.author_id, 1)
+        counters.change_group_count(instance.group_id, 1)
+        return
+    previous = getattr(instance, '_previous_owner', None)
+    if previous is None:
+        return
+    author_id, group_id = previous
+    if author_id != instance.author_id:
+        counters.change_author_count(author_id, -1)
+        counters.change_author_count(instance.author_id, 1)
+    if group_id != instance.group_id:
+        counters.change_group_count(group_id, -1)
+        counters.change_group_count(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_count(instance.author_id, -1)
+    counters.change_group_count(instance.group_id, -1)
+
+
+@receiver(pre_save, sender=Post)
+def reference_uploaded_image(sender, instance, raw=False, **kwargs):
+    instance._acquired_image = None
+    if raw or not instance.image or instance.image._committed:
+        return
+    instance._acquired_image = references.acquire_upload(instance.image)
+
+
+@receiver(post_save, sender=Post)
+def reference_saved_image(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    name = instance.image.name or ''
+    acquired = getattr(instance, '_acquired_image', None)
+    if acquired and acquired != name:
+        references.release(acquired)
+        acquired = None
+    previous = '' if created else getattr(instance, '_previous_image', None)
+    if previous is None or previous == name:
+        # Повторная загрузка той же картинки: ссылка уже была.
+        references.release(acquired)
+        return
+    if not acquired:
+        references.acquire(name)
+    references.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    references.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump(*feed_cache.post_scopes(instance))
+    page_cache.invalidate(*feed_cache.post_paths(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_comments(sender, instance, **kwargs):
+    if instance.post_id:
+        feed_cache.bump(f'post:{instance.post_id}')
+        page_cache.invalidate(
+            reverse('posts:post_detail', args=[instance.post_id]))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_page(sender, instance, **kwargs):
+    feed_cache.bump(f'group:{instance.pk}')
+    path = feed_cache.group_path(instance.slug)
+    if path:
+        page_cache.invalidate(path)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    feed_cache.bump(f'follow:{instance.user_id}')
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw=False, **kwargs):
+    if instance.image and not raw:
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    search.unindex_post(instance)
@@ -0,0 +1,54 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется хэшем своих байтов, поэтому одинаковые загрузки
+(репосты) лежат на диске один раз и делят миниатюры sorl-thumbnail.
+Сколько постов ссылается на файл, считает ``posts.references``.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_LENGTH = 32
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def content_name(name, digest):
+    """Имя файла в том же каталоге: хэш и расширение оригинала."""
+    directory, basename = posixpath.split(name)
+    extension = os.path.splitext(basename)[1].lower()
+    return posixpath.join(directory, digest + extension)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Имя выбирает _save по содержимому, совпадение — это дубль.
+        return name
+
+    def name_for(self, name, content):
+        """Имя, под которым ``save`` положит ``content``."""
+        return content_name(name, content_hash(content))
+
+    def _save(self, name, content):
+        name = self.name_for(name, content)
+        if self.exists(name):
+            return name
+        # Пишем под временным именем и переименовываем атомарно:
+        # параллельная загрузка тех же байтов не увидит половину файла.
+        partial = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,33 @@
+from django import template
+from django.http import QueryDict
+
+from posts.utils import elided_page_range
+
+register = template.Library()
+
+# Параметры запроса, которые переносятся в ссылки пагинатора.
+PRESERVED_PARAMS = ('q',)
+
+
+@register.simple_tag(takes_context=True)
+def query_string(context, **params):
+    """Строка запроса для ссылки пагинатора.
+
+    Сохраняет поисковый ``q`` и заменяет переданные параметры; параметр
+    со значением None убирается из ссылки.
+    """
+    request = context['request']
+    query = QueryDict(mutable=True)
+    for key in PRESERVED_PARAMS:
+        if key in request.GET:
+            query[key] = request.GET[key]
+    for key, value in params.items():
+        if value is not None:
+            query[key] = value
+    return f'?{query.urlencode()}'
+
+
+@register.simple_tag
+def page_range(page_obj):
+    """Сокращённый список номеров страниц, None — многоточие."""
+    return list(elided_page_range(page_obj))
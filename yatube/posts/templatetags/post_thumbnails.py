@@ -0,0 +1,107 @@
+import time
+from collections import defaultdict
+
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from sorl.thumbnail import default
+
+from core.middleware import current_timings
+from posts import thumbnails
+
+register = template.Library()
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+
+@register.simple_tag
+def post_image(image, css_class='card-img my-2'):
+    """Картинка поста с вариантами разной ширины и формата.
+
+    В ``srcset`` попадают только готовые варианты, недостающие ставятся
+    в фоновую очередь, поэтому запрос никогда не ждёт изменения размера.
+    Пока нет ни одного варианта запасного формата, ``src`` — оригинал
+    или заглушка.
+    """
+    if not image:
+        return ''
+    timings = current_timings.get()
+    if timings is None:
+        return _post_image(image, css_class)
+    started = time.perf_counter()
+    try:
+        return _post_image(image, css_class)
+    finally:
+        timings.add_render(
+            '{% post_image %}', time.perf_counter() - started)
+
+
+def _srcset(candidates):
+    return format_html_join(', ', '{} {}w', candidates)
+
+
+@register.simple_tag
+def prefetch_post_images(posts):
+    """Находит готовые варианты картинок всех постов страницы одним
+    чтением хранилища sorl-thumbnail; ``post_image`` их переиспользует."""
+    images = [post.image for post in posts if post.image]
+    if not images:
+        return ''
+    variants = thumbnails.image_variants()
+    found = iter(default.backend.get_ready_thumbnails([
+        (image, geometry, options)
+        for image in images for geometry, options in variants
+    ]))
+    for image in images:
+        image._ready_variants = [next(found) for _ in variants]
+    return ''
+
+
+def _ready_variants(image, variants):
+    prefetched = getattr(image, '_ready_variants', None)
+    if prefetched is not None and len(prefetched) == len(variants):
+        return prefetched
+    return default.backend.get_ready_thumbnails([
+        (image, geometry, options) for geometry, options in variants
+    ])
+
+
+def _post_image(image, css_class):
+    ready = defaultdict(list)
+    missing = []
+    variants = thumbnails.image_variants()
+    found = _ready_variants(image, variants)
+    for (geometry, options), thumbnail in zip(variants, found):
+        if thumbnail:
+            width = int(geometry.split('x')[0])
+            ready[options['format']].append((thumbnail.url, width))
+        else:
+            missing.append((geometry, options))
+    if missing:
+        thumbnails.schedule(image.name, missing)
+
+    *preferred, fallback = thumbnails.formats()
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    width = max(settings.POST_IMAGE_WIDTHS)
+    height = round(width * ratio_height / ratio_width)
+    sizes = settings.POST_IMAGE_SIZES
+    if ready[fallback]:
+        src = max(ready[fallback], key=lambda candidate: candidate[1])[0]
+        srcset = format_html(
+            ' srcset="{}" sizes="{}"', _srcset(ready[fallback]), sizes)
+    else:
+        src = (static(settings.THUMBNAIL_PLACEHOLDER)
+               if settings.THUMBNAIL_PLACEHOLDER else image.url)
+        srcset = ''
+    img = format_html(
+        '<img class="{}" src="{}"{} width="{}" height="{}" alt="" '
+        'loading="lazy">', css_class, src, srcset, width, height)
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">', (
+            (MIME_TYPES[image_format], _srcset(ready[image_format]), sizes)
+            for image_format in preferred if ready[image_format]
+        ))
+    if not sources:
+        return img
+    return format_html('<picture>{}{}</picture>', sources, img)
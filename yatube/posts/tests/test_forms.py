@@ -1,3 +1,4 @@
+import io
 import shutil
 import tempfile
 
@@ -9,6 +10,10 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from http import HTTPStatus
 
+from PIL import Image
+
+from posts.forms import PostForm
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
@@ -76,11 +81,8 @@ class PostFormTests(TestCase):
         self.assertRedirects(response, reverse(
             'posts:profile', kwargs={'username': PostFormTests.user.username}))
         self.assertEqual(Post.objects.count(), post_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                image='posts/small.gif'
-            ).exists()
-        )
+        self.assertRegex(
+            created_post.image.name, r'^posts/[0-9a-f]{32}\.(jpg|webp)$')
 
     def test_edit_post(self):
         """Валидная форма изменяет запись в Post."""
@@ -127,3 +129,60 @@ class PostFormTests(TestCase):
             follow=True
         )
         self.assertFalse(Comment.objects.filter(text='Я гость'))
+
+
+def image_upload(size, image_format='JPEG', **save_options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, image_format, **save_options)
+    return SimpleUploadedFile(
+        f'photo.{image_format.lower()}', buffer.getvalue(),
+        content_type=f'image/{image_format.lower()}'
+    )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_MASTER_FORMATS=('JPEG',),
+    IMAGE_MASTER_MAX_SIDE=100,
+)
+class ImageUploadTests(TestCase):
+    def form(self, upload):
+        return PostForm(data={'text': 'Пост'}, files={'image': upload})
+
+    def test_image_is_reencoded_to_capped_master(self):
+        """Оригинал уменьшается и перекодируется в JPEG без EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        form = self.form(image_upload((400, 200), 'PNG', exif=exif))
+        self.assertTrue(form.is_valid(), form.errors)
+        master = form.cleaned_data['image']
+        self.assertRegex(master.name, r'^[0-9a-f]{32}\.jpg$')
+        with Image.open(master) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 50))
+            self.assertFalse(image.getexif())
+
+    def test_master_name_is_content_hash(self):
+        """Одинаковые картинки получают одинаковые имена."""
+        names = set()
+        for _ in range(2):
+            form = self.form(image_upload((50, 50)))
+            self.assertTrue(form.is_valid(), form.errors)
+            names.add(form.cleaned_data['image'].name)
+        self.assertEqual(len(names), 1)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=300)
+    def test_oversized_dimensions_are_rejected(self):
+        """Слишком большая по заголовку картинка не принимается."""
+        form = self.form(image_upload((400, 200)))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'image_too_large')
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=10)
+    def test_oversized_file_is_rejected(self):
+        """Слишком большой файл не принимается."""
+        form = self.form(image_upload((50, 50)))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'file_too_large')
@@ -1,7 +1,18 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
 
-from ..models import Group, Post
+from .. import search
+from ..models import Comment, Follow, Group, Post, Profile
 
 User = get_user_model()
 
@@ -32,3 +43,182 @@ class PostModelTest(TestCase):
         post = PostModelTest.post
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
+
+
+class PostCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def counts(self):
+        self.user.refresh_from_db()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        profile = Profile.objects.filter(user=self.user).first()
+        return (
+            profile.posts_count if profile else 0,
+            self.group.posts_count,
+            self.other_group.posts_count,
+        )
+
+    def test_counters_follow_post_writes(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        self.assertEqual(self.counts(), (1, 1, 0))
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.counts(), (1, 0, 1))
+        post.delete()
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+    def test_bulk_create_updates_counters(self):
+        """bulk_create тоже учитывается в счётчиках."""
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Пост {i}', group=self.group)
+            for i in range(3)
+        ])
+        self.assertEqual(self.counts(), (3, 3, 0))
+
+    def test_bulk_create_skips_ignored_conflicts(self):
+        """Строки, пропущенные из-за ignore_conflicts, не учитываются."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        Post.objects.bulk_create([
+            Post(pk=post.pk, author=self.user, text='Дубль',
+                 group=self.group),
+            Post(author=self.user, text='Новый пост', group=self.group),
+        ], ignore_conflicts=True)
+        self.assertEqual(self.counts(), (2, 2, 0))
+        self.assertFalse(search.search_posts(Post.objects.all(), 'Дубль'))
+
+    def test_recount_command_repairs_counters(self):
+        """Команда recount_posts восстанавливает счётчики."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        Profile.objects.update(posts_count=100)
+        Group.objects.update(posts_count=100)
+        call_command('recount_posts', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 1, 0))
+
+
+class BulkDataCommandsTest(TestCase):
+    MODELS = ('users', 'groups', 'posts', 'comments', 'follows')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group,
+            image='posts/picture.gif')
+        Post.objects.filter(pk=cls.post.pk).update(
+            pub_date=datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def round_trip(self, fmt):
+        paths = {}
+        for name in self.MODELS:
+            paths[name] = os.path.join(self.directory, f'{name}.{fmt}')
+            call_command('export_data', name, format=fmt,
+                         output=paths[name], stderr=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        for name in self.MODELS:
+            call_command('import_data', name, paths[name], format=fmt,
+                         batch_size=1, stdout=StringIO(), stderr=StringIO())
+
+    def test_export_import_round_trip(self):
+        """Выгрузка и загрузка сохраняют записи, id, даты и картинки."""
+        for fmt in ('jsonl', 'csv'):
+            with self.subTest(fmt=fmt):
+                self.round_trip(fmt)
+                post = Post.objects.select_related('author', 'group').get()
+                self.assertEqual(post.pk, self.post.pk)
+                self.assertEqual(post.author.username, 'author')
+                self.assertEqual(post.group.slug, 'test-slug')
+                self.assertEqual(post.image.name, 'posts/picture.gif')
+                self.assertEqual(post.pub_date.year, 2020)
+                self.assertEqual(post.comments.get().author.username,
+                                 'reader')
+                self.assertTrue(Follow.objects.filter(
+                    user__username='reader',
+                    author__username='author').exists())
+                self.assertEqual(post.author.profile.posts_count, 1)
+
+    def test_export_to_stdout_is_json_lines(self):
+        """Выгрузка в stdout — по одной записи JSON на строку, прогресс —
+        в stderr команды."""
+        out, err = StringIO(), StringIO()
+        call_command('export_data', 'groups', stdout=out, stderr=err)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([json.loads(line)['slug'] for line in lines],
+                         ['test-slug'])
+        self.assertIn('Выгружено строк: 1', err.getvalue())
+
+    def test_import_skips_unknown_references(self):
+        """Строки со ссылками на неизвестных авторов пропускаются."""
+        path = os.path.join(self.directory, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write('{"text": "Пост", "author": "nobody"}\n')
+        out = StringIO()
+        call_command('import_data', 'posts', path, stdout=out,
+                     stderr=StringIO())
+        self.assertIn('пропущено: 1', out.getvalue())
+
+    def test_import_refreshes_cached_pages(self):
+        """После загрузки постов и комментариев страницы группы, автора
+        и поста не отдаются из кэша и не отвечают 304."""
+        cache.clear()
+        pages = {
+            'posts': (
+                reverse('posts:group_list', args=[self.group.slug]),
+                reverse('posts:profile', args=[self.author.username]),
+            ),
+            'comments': (
+                reverse('posts:post_detail', args=[self.post.pk]),
+            ),
+        }
+        rows = {
+            'posts': {'text': 'Загруженный пост', 'author': 'author',
+                      'group': 'test-slug'},
+            'comments': {'post': self.post.pk, 'author': 'reader',
+                         'text': 'Загруженный комментарий'},
+        }
+        for name, urls in pages.items():
+            responses = {url: self.client.get(url) for url in urls}
+            path = os.path.join(self.directory, f'{name}.jsonl')
+            with open(path, 'w', encoding='utf-8') as output:
+                output.write(json.dumps(rows[name]) + '\n')
+            call_command('import_data', name, path, stdout=StringIO(),
+                         stderr=StringIO())
+            for url, response in responses.items():
+                with self.subTest(model=name, url=url):
+                    again = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                    self.assertEqual(again.status_code, 200)
+                    self.assertContains(again, rows[name]['text'])
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+
+from .. import references
+from ..models import ImageReference, Post
+from ..storage import image_storage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+
+def gif(color):
+    buffer = BytesIO()
+    Image.new('RGB', (2, 1), color).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_QUEUE_WORKERS=0)
+class ContentAddressedStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def files(self):
+        return sorted(os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')))
+
+    def create_post(self, content, name='picture.gif'):
+        return Post.objects.create(
+            author=self.user, text='Пост', image=ContentFile(content, name))
+
+    def test_identical_bytes_are_stored_once(self):
+        """Одинаковые загрузки получают одно имя и один файл."""
+        first = self.create_post(gif('red'), 'one.gif')
+        second = self.create_post(gif('red'), 'two.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{32}\.gif$')
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual(
+            ImageReference.objects.get(name=first.image.name).count, 2)
+
+    def test_file_is_deleted_with_last_reference(self):
+        """Файл живёт, пока на него ссылается хотя бы один пост."""
+        first = self.create_post(gif('green'))
+        second = self.create_post(gif('green'))
+        first.delete()
+        self.assertTrue(image_storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(image_storage.exists(second.image.name))
+        self.assertFalse(ImageReference.objects.exists())
+
+    def test_reupload_survives_pending_delete(self):
+        """Удаление последнего старого поста, запущенное между проверкой
+        «файл уже есть» и сохранением нового поста, не стирает файл."""
+        old = self.create_post(gif('purple'))
+        pending = []
+        with mock.patch.object(references, 'delete_file',
+                               side_effect=pending.append):
+            old.delete()
+        self.assertEqual(pending, [old.image.name])
+        exists = image_storage.exists
+
+        def exists_then_delete(name):
+            found = exists(name)
+            while pending:
+                references.delete_file(pending.pop())
+            return found
+
+        with mock.patch.object(image_storage, 'exists',
+                               side_effect=exists_then_delete):
+            new = self.create_post(gif('purple'))
+        self.assertEqual(new.image.name, old.image.name)
+        self.assertTrue(image_storage.exists(new.image.name))
+        self.assertEqual(
+            ImageReference.objects.get(name=new.image.name).count, 1)
+
+    def test_edit_releases_previous_image(self):
+        """Замена картинки при редактировании освобождает старую."""
+        post = self.create_post(gif('blue'))
+        old_name = post.image.name
+        post.image = ContentFile(gif('white'), 'new.gif')
+        post.save()
+        self.assertFalse(image_storage.exists(old_name))
+        self.assertEqual(
+            list(ImageReference.objects.values_list('name', 'count')),
+            [(post.image.name, 1)])
+
+    def test_dedupe_media_merges_legacy_files(self):
+        """dedupe_media склеивает старые дубли и переводит на них посты."""
+        directory = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        os.makedirs(directory)
+        for name, content in (('a.gif', gif('black')), ('b.gif', gif('black')),
+                              ('orphan.gif', gif('yellow'))):
+            with open(os.path.join(directory, name), 'wb') as file:
+                file.write(content)
+        first = Post.objects.create(author=self.user, text='Пост')
+        second = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.filter(pk=first.pk).update(image='posts/a.gif')
+        Post.objects.filter(pk=second.pk).update(image='posts/b.gif')
+
+        out = StringIO()
+        call_command('dedupe_media', '--prune', stdout=out)
+
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        (name,) = names
+        self.assertEqual(self.files(), [os.path.basename(name)])
+        self.assertEqual(ImageReference.objects.get(name=name).count, 2)
+        self.assertIn('дублей: 1', out.getvalue())
+        self.assertIn('без ссылок: 1', out.getvalue())
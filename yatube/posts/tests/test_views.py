@@ -1,21 +1,41 @@
 import shutil
+from io import BytesIO, StringIO
 import tempfile
+import time
+from unittest import mock, skipUnless
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
+from django.db import connection
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from PIL import Image
 
-from ..models import Group, Post, Follow
+from .. import search, thumbnails, timeline
+from ..models import (Comment, Group, Post, Follow, TimelineCelebrity,
+                      TimelineEntry)
+from ..utils import elided_page_range
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
 
+def gif_bytes(color):
+    buffer = BytesIO()
+    Image.new('RGB', (2, 1), color).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostsViewsTests(TestCase):
     @classmethod
@@ -180,7 +200,7 @@ class PostsViewsTests(TestCase):
         self.assertNotIn(PostsViewsTests.post_1, posts_in_page)
 
     def test_cache_index_page(self):
-        """Главная страница хранится в кэше 20 секунд."""
+        """Главная страница кэшируется до изменения постов."""
         TEXT_FOR_POST = 'Текст2.'
         post = Post.objects.create(
             text=TEXT_FOR_POST,
@@ -189,7 +209,7 @@ class PostsViewsTests(TestCase):
         )
         response_before = self.authorized_client.get(
             reverse('posts:index')).content
-        post.delete()
+        Post.objects.filter(pk=post.pk).update(text='Без сигналов')
         response_after = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertEqual(response_before, response_after)
@@ -198,6 +218,36 @@ class PostsViewsTests(TestCase):
             reverse('posts:index')).content
         self.assertNotEqual(response_before, response_after)
 
+    def test_cache_invalidated_on_post_delete(self):
+        """Удаление поста сразу сбрасывает кэш лент."""
+        post = Post.objects.create(
+            text='Текст2.',
+            author=PostsViewsTests.user,
+            group=PostsViewsTests.group,
+        )
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group_slug'}),
+            reverse('posts:profile', kwargs={'username': 'HasNoName'}),
+        ]
+        for page in pages:
+            self.authorized_client.get(page)
+        post.delete()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertNotContains(response, 'Текст2.')
+
+    def test_follow_feed_not_shared_with_index(self):
+        """Лента подписок не берётся из кэша главной страницы."""
+        self.authorized_client.get(reverse('posts:index'))
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, PostsViewsTests.post_1.text)
+        Follow.objects.create(
+            user=self.user_client, author=PostsViewsTests.user)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, PostsViewsTests.post_1.text)
+
     def test_auth_user_follow(self):
         """Пользователь может подписываться и отписываться."""
         follow = Follow.objects.create(
@@ -307,3 +357,618 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(self.len_of_page(request + '?page=2'),
                                  value)
+
+
+@override_settings(PAGINATOR_ON_EACH_SIDE=2, PAGINATOR_ON_ENDS=1)
+class ElidedPageRangeTest(TestCase):
+    def pages(self, number, count):
+        page = Paginator(range(count), 1).page(number)
+        return list(elided_page_range(page))
+
+    def test_short_range_is_not_elided(self):
+        """Немного страниц показываются все."""
+        self.assertEqual(self.pages(3, 7), [1, 2, 3, 4, 5, 6, 7])
+
+    def test_long_range_is_elided(self):
+        """Далёкие страницы сворачиваются в многоточие."""
+        self.assertEqual(self.pages(1, 100), [1, 2, 3, None, 100])
+        self.assertEqual(
+            self.pages(50, 100), [1, None, 48, 49, 50, 51, 52, None, 100])
+        self.assertEqual(self.pages(100, 100), [1, None, 98, 99, 100])
+
+    def test_paginator_size_does_not_grow_with_pages(self):
+        """Разметка пагинатора одинакова для 100 и 100 000 страниц."""
+        request = RequestFactory().get('/')
+        sizes = []
+        for count in (100, 100000):
+            page = Paginator(range(count), 1).page(count // 2)
+            html = render_to_string(
+                'posts/includes/paginator.html',
+                {'page_obj': page}, request=request
+            )
+            sizes.append(html.count('<li'))
+        self.assertEqual(sizes, [13, 13])
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        objs = [
+            Post(
+                author=cls.user,
+                text=f'Тестовый пост {i}',
+                group=cls.group
+            )
+            for i in range(1, 14)
+        ]
+        Post.objects.bulk_create(objs)
+        cls.pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсоры ?after=/?before= листают ленту без пропусков."""
+        for page in self.pages:
+            with self.subTest(page=page):
+                first = self.client.get(page).context['page_obj']
+                self.assertEqual(len(first), 10)
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    page, {'after': first.next_cursor()}
+                ).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                back = self.client.get(
+                    page, {'before': second.previous_cursor()}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_cursor_page_skips_count(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        first = self.client.get(self.pages[0]).context['page_obj']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.pages[0], {'after': first.next_cursor()})
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.client.get(self.pages[0], {'after': 'broken'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertFalse(page_obj.has_previous())
+
+
+@override_settings(TIMELINE_FANOUT=True, TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+class TimelineViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(text='Старый пост', author=cls.author)
+        Follow.objects.create(user=cls.fan, author=cls.celebrity)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дополняет ленту, отписка очищает её."""
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': 'author'}))
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), ['Старый пост'])
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': 'author'}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков при записи."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+
+    def test_celebrity_posts_read_on_demand(self):
+        """Посты автора с множеством подписчиков читаются без разноса."""
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        Post.objects.create(text='Пост знаменитости', author=self.celebrity)
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author=self.celebrity).exists())
+        self.assertEqual(self.feed(), ['Пост знаменитости'])
+
+    def test_celebrity_below_limit_gets_fanned_out(self):
+        """Когда подписчиков становится мало, rebuild_timelines
+        раскладывает посты, а до того они читаются при просмотре."""
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        Post.objects.create(text='Пост знаменитости', author=self.celebrity)
+        self.client.force_login(self.fan)
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': 'celebrity'}))
+        self.client.force_login(self.reader)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader, post__author=self.celebrity).exists())
+        self.assertEqual(self.feed(), ['Пост знаменитости'])
+        out = StringIO()
+        call_command('rebuild_timelines', stdout=out)
+        self.assertIn('снято: 1', out.getvalue())
+        self.assertFalse(TimelineCelebrity.objects.exists())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post__author=self.celebrity).exists())
+        self.assertEqual(self.feed(), ['Пост знаменитости'])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pages_follow_timeline_order(self):
+        """Курсор листает ленту по дате и id записи ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.bulk_create([
+            Post(text=f'Пост {number}', author=self.author,
+                 pub_date=Post.objects.get().pub_date)
+            for number in range(12)
+        ])
+        call_command('rebuild_timelines', 'reader', stdout=StringIO())
+        url = reverse('posts:follow_index')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'after': first.next_cursor()}).context['page_obj']
+        texts = [post.text for post in [*first, *second]]
+        self.assertEqual(len(texts), 13)
+        self.assertEqual(len(set(texts)), 13)
+        self.assertFalse(second.has_next())
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+    def test_timeline_is_read_by_index(self):
+        """Лента без «знаменитостей» листается по индексу без сортировки."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        query = timeline.timeline_posts(self.reader)[:10].query
+        sql, params = query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('timeline_user_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user, group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+
+    def query_plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or (
+                        'posts_post' not in sql
+                        and 'posts_comment' not in sql):
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans[sql] = ' '.join(row[-1] for row in cursor.fetchall())
+        return plans
+
+    def test_hot_views_use_indexes(self):
+        """Ленты и комментарии читаются по индексам без сортировки."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            for sql, plan in self.query_plans(url).items():
+                with self.subTest(url=url, sql=sql):
+                    self.assertNotIn('TEMP B-TREE', plan)
+                    self.assertNotRegex(
+                        plan, r'SCAN (TABLE )?posts_(post|comment)\b(?! USING)'
+                    )
+
+
+class PostCountersViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def test_views_read_counters_instead_of_count(self):
+        """Профиль и пост берут число постов из счётчика."""
+        urls = [
+            reverse('posts:profile', kwargs={'username': 'auth'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.context['posts_count'], 1)
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'].upper())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=small_gif,
+                content_type='image/gif'
+            )
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_falls_back_to_original_until_ready(self):
+        """Пока миниатюры нет, страница отдаёт оригинал и не ждёт."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertContains(response, self.post.image.url)
+        thumbnails.generate(self.post.image.name)
+        # Очередь после generate() сама сбрасывает кэш страниц поста.
+        cache.clear()
+        response = self.client.get(url)
+        self.assertNotContains(response, self.post.image.url)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def render_image(self):
+        return Template(
+            '{% load post_thumbnails %}{% post_image post.image %}'
+        ).render(Context({'post': self.post}))
+
+    def test_srcset_lists_every_width(self):
+        """Готовые варианты всех ширин попадают в srcset."""
+        self.assertNotIn('srcset', self.render_image())
+        thumbnails.generate(self.post.image.name)
+        html = self.render_image()
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertIn(f' {width}w', html)
+        self.assertNotIn('<picture>', html)
+
+    def test_page_reads_thumbnail_store_once(self):
+        """Варианты картинок всей страницы читаются одним get_many."""
+        posts = [Post.objects.get(pk=self.post.pk)] + [
+            Post.objects.create(
+                text=f'Пост {number}', author=self.user,
+                image=SimpleUploadedFile(f'{number}.gif', gif_bytes(color)))
+            for number, color in enumerate(('red', 'green'))
+        ]
+        for post in posts:
+            thumbnails.generate(post.image.name)
+        reads = []
+        get_many = thumbnails.KVStore.get_many
+
+        def counting_get_many(store, image_files):
+            reads.append(len(image_files))
+            return get_many(store, image_files)
+
+        with mock.patch.object(
+                thumbnails.KVStore, 'get_many', counting_get_many):
+            html = Template(
+                '{% load post_thumbnails %}'
+                '{% prefetch_post_images posts %}'
+                '{% for post in posts %}{% post_image post.image %}'
+                '{% endfor %}'
+            ).render(Context({'posts': posts}))
+        self.assertEqual(reads, [len(posts) * len(
+            thumbnails.image_variants())])
+        self.assertEqual(html.count('960w'), len(posts))
+
+    @override_settings(THUMBNAIL_QUEUE_WORKERS=0)
+    def test_failed_image_is_not_rescheduled(self):
+        """После неудачи рендеры не запускают генерацию снова."""
+        with mock.patch.object(thumbnails, 'generate',
+                               side_effect=OSError) as generate, \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  lambda func: func()), \
+                self.assertLogs('posts.thumbnails', level='ERROR'):
+            self.render_image()
+            self.render_image()
+        self.assertEqual(generate.call_count, 1)
+
+    @override_settings(POST_IMAGE_FORMATS=('PNG', 'JPEG'))
+    def test_picture_offers_preferred_format(self):
+        """Предпочтительный формат отдаётся через <source> в <picture>."""
+        thumbnails.generate(self.post.image.name)
+        html = self.render_image()
+        self.assertTrue(html.startswith('<picture><source type="image/png"'))
+        self.assertIn('.png 320w', html)
+        self.assertIn('.jpg 960w', html)
+
+
+@override_settings(COMMENTS_PER_PAGE=20)
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def add_comments(self, count):
+        for i in range(count):
+            commenter = User.objects.create_user(username=f'user_{i}_{count}')
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'Комментарий {i}')
+
+    def test_query_count_does_not_depend_on_comments(self):
+        """Число запросов post_detail не растёт вместе с комментариями."""
+        for total in (1, 30):
+            with self.subTest(total=total):
+                self.add_comments(total)
+                # Валидаторы условного GET, пост с автором, комментарии.
+                with self.assertNumQueries(3):
+                    self.client.get(self.url)
+
+    def test_comments_load_in_portions(self):
+        """Комментарии подгружаются порциями по курсору."""
+        self.add_comments(25)
+        comments = self.client.get(self.url).context['comments']
+        self.assertEqual(len(comments), 20)
+        more = self.client.get(
+            self.url, {'comments_after': comments.next_cursor()}
+        ).context['comments']
+        self.assertEqual(len(more), 5)
+        self.assertFalse(more.has_next())
+        self.assertEqual(more[0].text, 'Комментарий 20')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'индекс FTS5 из SQLite')
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.cat_post = Post.objects.create(
+            text='Кошка спит на окне', author=cls.user)
+        cls.cats_post = Post.objects.create(
+            text='Кошка и ещё раз кошка', author=cls.user)
+        Post.objects.create(text='Собака гуляет во дворе', author=cls.user)
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_search_ranks_by_relevance(self):
+        """Поиск находит посты и ставит релевантные выше."""
+        self.assertEqual(self.search('кошка'),
+                         [self.cats_post.pk, self.cat_post.pk])
+        self.assertEqual(self.search('собака кошка'), [])
+        self.assertEqual(self.search('"*)'), [])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_mode_keeps_relevance_order(self):
+        """Курсорный режим лент не сбрасывает сортировку поиска."""
+        newest = Post.objects.create(
+            text='Кошка ' + 'и много других слов ' * 10, author=self.user)
+        for params in ({}, {'after': 'токен'}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': 'кошка', **params})
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']],
+                    [self.cats_post.pk, self.cat_post.pk, newest.pk])
+
+    def test_index_follows_post_writes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        self.cat_post = Post.objects.get(pk=self.cat_post.pk)
+        self.cat_post.text = 'Попугай на окне'
+        self.cat_post.save()
+        self.assertEqual(self.search('попугай'), [self.cat_post.pk])
+        self.assertNotIn(self.cat_post.pk, self.search('кошка'))
+        self.cat_post.delete()
+        self.assertEqual(self.search('попугай'), [])
+
+    def test_rebuild_command_indexes_bulk_posts(self):
+        """Команда rebuild_search_index индексирует все посты."""
+        Post.objects.bulk_create([
+            Post(text=f'Хомяк {i}', author=self.user) for i in range(5)
+        ])
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(len(self.search('хомяк')), 5)
+        self.assertEqual(len(self.search('кошка')), 2)
+
+    def test_rebuild_keeps_index_searchable(self):
+        """Переиндексация не опустошает индекс и убирает лишние строки."""
+        Post.objects.bulk_create([
+            Post(text=f'Хомяк {i}', author=self.user) for i in range(5)
+        ])
+        search.rebuild(batch_size=2)
+        Post.objects.filter(pk=self.cats_post.pk).update(text='Ёжик')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post WHERE id = %s',
+                           [self.cat_post.pk])
+            cursor.execute(
+                f'INSERT INTO {search.FTS_TABLE}(rowid, text) '
+                "VALUES (100000, 'Кошка-призрак')")
+        found = []
+        search.rebuild(
+            batch_size=2,
+            progress=lambda indexed: found.append(len(self.search('хомяк'))))
+        self.assertEqual(found, [5, 5, 5, 5])
+        self.assertEqual(self.search('кошка'), [])
+        self.assertEqual(self.search('ёжик'), [self.cats_post.pk])
+
+    def test_pagination_keeps_query(self):
+        """Ссылки пагинатора сохраняют поисковый запрос."""
+        Post.objects.bulk_create([
+            Post(text=f'Хомяк {i}', author=self.user) for i in range(12)
+        ])
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'хомяк'})
+        self.assertContains(
+            response, '?q=%D1%85%D0%BE%D0%BC%D1%8F%D0%BA&amp;page=2')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_answer_not_modified(self):
+        """Повторный запрос с ETag получает 304 не больше чем за один
+        SQL-запрос."""
+        client = Client()
+        client.force_login(self.author)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as queries:
+                    again = self.revalidate(client, url, response)
+                self.assertLessEqual(len(queries), 1)
+                self.assertEqual(again.status_code, 304)
+
+    def test_writes_change_etag(self):
+        """Новый пост меняет ETag лент, комментарий — страницы поста."""
+        responses = {url: self.client.get(url) for url in self.urls}
+        Post.objects.create(
+            text='Ещё пост', author=self.author, group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(
+                    self.client, url, responses[url]).status_code, 200)
+        detail = self.urls[3]
+        response = self.client.get(detail)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.assertEqual(
+            self.revalidate(self.client, detail, response).status_code, 200)
+
+    def test_delete_and_edit_move_last_modified(self):
+        """Удаление и правка поста сдвигают Last-Modified, поэтому клиент
+        с одним If-Modified-Since не получает устаревшую страницу."""
+        post = Post.objects.create(
+            text='Свежий пост', author=self.author, group=self.group)
+        changes = (
+            ('delete', post.delete),
+            ('edit', lambda: Post.objects.get(pk=self.post.pk).save()),
+        )
+        # Вошедший пользователь: ответы строит view, а не кэш страниц.
+        client = Client()
+        client.force_login(self.author)
+        for shift, (name, change) in enumerate(changes, 1):
+            responses = {url: client.get(url) for url in self.urls}
+            # Last-Modified точен до секунды.
+            later = time.time() + 5 * shift
+            with mock.patch('core.versions.time.time', return_value=later):
+                change()
+            for url, response in responses.items():
+                with self.subTest(change=name, url=url):
+                    again = client.get(
+                        url,
+                        HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                    self.assertEqual(again.status_code, 200)
+                    self.assertEqual(again['Last-Modified'],
+                                     http_date(later))
+
+    def test_etag_depends_on_viewer_and_page(self):
+        """Разные пользователи и страницы не делят один ETag."""
+        url = self.urls[0]
+        anonymous = self.client.get(url)
+        author = Client()
+        author.force_login(self.author)
+        self.assertEqual(
+            self.revalidate(author, url, anonymous).status_code, 200)
+        self.assertEqual(self.client.get(
+            url + '?page=2', HTTP_IF_NONE_MATCH=anonymous['ETag']
+        ).status_code, 200)
+
+    def test_relogin_changes_etag(self):
+        """После нового входа страница с формой комментария отдаётся
+        заново: в старой остался бы прежний CSRF-токен."""
+        url = self.urls[3]
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(url)
+        client.logout()
+        client.force_login(self.author)
+        again = self.revalidate(client, url, response)
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again['ETag'], response['ETag'])
+
+    def test_missing_objects_still_return_404(self):
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,199 @@
+"""Фоновая подготовка вариантов картинок постов.
+
+Варианты из ``image_variants()`` (ширины ``POST_IMAGE_WIDTHS`` в каждом
+из форматов ``POST_IMAGE_FORMATS``) строятся в локальном пуле потоков
+сразу после сохранения поста с картинкой, а шаблоны только читают
+готовый результат из key-value хранилища sorl-thumbnail и никогда
+не ждут Pillow.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from PIL import features
+from sorl.thumbnail import base, default
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import page_cache
+
+from . import feed_cache
+from .models import Post
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    def _prepare(self, file_, geometry_string, options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из key-value хранилища или None."""
+        if not file_:
+            return None
+        thumbnail = self._prepare(file_, geometry_string, options)
+        return default.kvstore.get(thumbnail)
+
+    def get_ready_thumbnails(self, requests):
+        """То же для списка (file_, geometry_string, options) за одно
+        чтение key-value хранилища."""
+        thumbnails = [
+            self._prepare(file_, geometry_string, dict(options))
+            for file_, geometry_string, options in requests
+        ]
+        if hasattr(default.kvstore, 'get_many'):
+            return default.kvstore.get_many(thumbnails)
+        return [default.kvstore.get(thumbnail) for thumbnail in thumbnails]
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def get_many(self, image_files):
+        """Как get() для списка: один get_many кэша и, для промахов,
+        один запрос к базе."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in dict.fromkeys(keys) if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            found = {
+                key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            self.cache.set_many(
+                found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return [_deserialize(values[key]) for key in keys]
+
+
+def _deserialize(value):
+    if not value or value == cached_db_kvstore.EMPTY_VALUE:
+        return None
+    return deserialize_image_file(value)
+
+
+@lru_cache(maxsize=None)
+def _webp_supported():
+    return features.check('webp')
+
+
+def formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет Pillow; последний —
+    запасной для браузеров без ``<picture>``."""
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format != 'WEBP' or _webp_supported()
+    ]
+
+
+def image_variants():
+    """(geometry, options) всех вариантов картинки поста."""
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    return [
+        (f'{width}x{round(width * ratio_height / ratio_width)}',
+         {'crop': 'center', 'upscale': True, 'format': image_format})
+        for image_format in formats()
+        for width in settings.POST_IMAGE_WIDTHS
+    ]
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_QUEUE_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def generate(name, variants=None):
+    """Строит миниатюры картинки для всех вариантов."""
+    # Ключи sorl зависят от хранилища: оно должно совпадать с Post.image.
+    source = ImageFile(name, image_storage)
+    for geometry, options in variants or image_variants():
+        default.backend.get_thumbnail(source, geometry, **options)
+
+
+def _failed_key(name):
+    return f'thumb-failed:{name}'
+
+
+def _run(job):
+    name, variants = job
+    try:
+        generate(name, [(geometry, dict(options))
+                        for geometry, options in variants])
+        # Фрагменты лент могли закэшироваться с оригиналом вместо миниатюры.
+        for post in Post.objects.filter(image=name).only(
+                'pk', 'author_id', 'group_id'):
+            feed_cache.bump(*feed_cache.post_scopes(post))
+            page_cache.invalidate(*feed_cache.post_paths(post))
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+        # Иначе каждый промах кэша страницы заново декодирует оригинал,
+        # который Pillow всё равно не осилит.
+        cache.set(_failed_key(name), True, settings.THUMBNAIL_RETRY_AFTER)
+    finally:
+        with _lock:
+            _pending.discard(job)
+        close_old_connections()
+
+
+def _submit(job):
+    with _lock:
+        if job in _pending:
+            return
+        _pending.add(job)
+    if settings.THUMBNAIL_QUEUE_WORKERS:
+        _get_executor().submit(_run, job)
+    else:
+        _run(job)
+
+
+def schedule(name, variants=None):
+    """Ставит картинку в очередь после фиксации транзакции.
+
+    После неудачи картинка не ставится заново ``THUMBNAIL_RETRY_AFTER``
+    секунд.
+    """
+    if not name or cache.get(_failed_key(name)):
+        return
+    job = (name, tuple(
+        (geometry, tuple(sorted(options.items())))
+        for geometry, options in variants or image_variants()
+    ))
+    transaction.on_commit(lambda: _submit(job))
+
+
+def wait():
+    """Дожидается окончания всех поставленных в очередь миниатюр."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,156 @@
+"""Домашняя лента подписок с разносом постов при записи (fan-out-on-write).
+
+Каждый новый пост раскладывается в ленты подписчиков автора вместе с
+датой публикации, поэтому ``follow_index`` листает готовый список по
+индексу (пользователь, дата), а не делает join через Follow с сортировкой.
+Авторы, у которых больше ``TIMELINE_FANOUT_MAX_FOLLOWERS`` подписчиков,
+отмечены ``TimelineCelebrity`` и не раскладываются: их посты подмешиваются
+при чтении (fan-out-on-read). Отметка ставится при подписке, а снимается
+только в ``rebuild_timelines``: раскладка всех постов по лентам
+подписчиков слишком долгая для запроса отписки.
+"""
+from django.conf import settings
+from django.db.models import Count, F, Q
+
+from .models import Follow, Post, TimelineCelebrity, TimelineEntry
+
+
+def is_enabled():
+    return settings.TIMELINE_FANOUT
+
+
+def _over_limit(author_id):
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    return Follow.objects.filter(
+        author_id=author_id
+    ).order_by().values('pk')[limit:limit + 1].exists()
+
+
+def is_celebrity(author_id):
+    """Посты автора читаются при просмотре ленты, без разноса."""
+    return TimelineCelebrity.objects.filter(author_id=author_id).exists()
+
+
+def _bulk_insert(entries):
+    batch = []
+    for user_id, post_id, pub_date in entries:
+        batch.append(TimelineEntry(
+            user_id=user_id, post_id=post_id, pub_date=pub_date))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _author_posts(author_id):
+    return Post.objects.filter(author_id=author_id).order_by().values_list(
+        'pk', 'pub_date')
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        (user_id, post.pk, post.pub_date)
+        for user_id in followers.iterator(
+            chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+
+def backfill(user, author):
+    """Добавляет в ленту подписчика уже опубликованные посты автора.
+
+    Если подписка сделала автора «знаменитостью», он отмечается, и его
+    посты дальше читаются при просмотре ленты.
+    """
+    if is_celebrity(author.pk):
+        return
+    if _over_limit(author.pk):
+        TimelineCelebrity.objects.get_or_create(author=author)
+        return
+    _bulk_insert(
+        (user.pk, post_id, pub_date)
+        for post_id, pub_date in _author_posts(author.pk).iterator(
+            chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+
+def prune(user, author):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def refresh_celebrities():
+    """Сверяет отметки ``TimelineCelebrity`` с числом подписчиков.
+
+    Авторы сверх порога (например, после import_data) отмечаются, а
+    авторы, у которых подписчиков стало меньше, раскладываются по лентам
+    подписчиков и только потом теряют отметку, поэтому их посты из лент
+    не пропадают. Возвращает (отмечено, снято).
+    """
+    over_limit = Follow.objects.order_by().values('author').annotate(
+        total=Count('pk')
+    ).filter(total__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+    promoted = TimelineCelebrity.objects.bulk_create([
+        TimelineCelebrity(author_id=row['author'])
+        for row in over_limit.exclude(author__timeline_celebrity__isnull=False)
+    ])
+    demoted = 0
+    for celebrity in TimelineCelebrity.objects.iterator():
+        if _over_limit(celebrity.author_id):
+            continue
+        posts = list(_author_posts(celebrity.author_id))
+        followers = Follow.objects.filter(
+            author_id=celebrity.author_id).values_list('user_id', flat=True)
+        _bulk_insert(
+            (user_id, post_id, pub_date)
+            for user_id in followers.iterator(
+                chunk_size=settings.TIMELINE_BATCH_SIZE)
+            for post_id, pub_date in posts
+        )
+        celebrity.delete()
+        demoted += 1
+    return len(promoted), demoted
+
+
+def rebuild(user):
+    """Пересобирает ленту пользователя с нуля."""
+    TimelineEntry.objects.filter(user=user).delete()
+    for follow in Follow.objects.filter(user=user).select_related('author'):
+        backfill(user, follow.author)
+
+
+def _by_post_date(posts):
+    return posts.annotate(
+        timeline_date=F('pub_date'), timeline_post=F('pk'))
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя, от новых к старым.
+
+    Ключ сортировки — поля ``timeline_date`` и ``timeline_post``
+    (дата и id поста), по ним же ленту листает курсорный пагинатор.
+    Пока пользователь не подписан на «знаменитостей», дата берётся
+    из ``TimelineEntry``, и запрос идёт по индексу ленты.
+    """
+    if not is_enabled():
+        posts = _by_post_date(
+            Post.objects.filter(author__following__user=user))
+    else:
+        celebrities = list(Follow.objects.filter(
+            user=user, author__timeline_celebrity__isnull=False
+        ).values_list('author', flat=True))
+        if celebrities:
+            entries = TimelineEntry.objects.filter(user=user).values('post')
+            posts = _by_post_date(Post.objects.filter(
+                Q(pk__in=entries) | Q(author__in=celebrities)))
+        else:
+            posts = Post.objects.filter(timeline_entries__user=user).annotate(
+                timeline_date=F('timeline_entries__pub_date'),
+                timeline_post=F('timeline_entries__post'))
+    return posts.order_by('-timeline_date', '-timeline_post')
@@ -0,0 +1,112 @@
+"""Обработка картинок, загруженных к постам.
+
+Загрузка пишется во временный файл (``FILE_UPLOAD_HANDLERS``), размеры
+проверяются по заголовку до декодирования, а в хранилище попадает
+мастер-копия без метаданных: не больше ``IMAGE_MASTER_MAX_SIDE`` по
+стороне и, если хватает лестницы качеств, не больше
+``IMAGE_MASTER_MAX_BYTES``. Имя файла — хэш его содержимого.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def check_header(upload):
+    """Отклоняет слишком большие файлы и картинки, не декодируя их."""
+    if upload.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.',
+            code='file_too_large',
+            params={'limit': settings.IMAGE_UPLOAD_MAX_BYTES // 2 ** 20},
+        )
+    try:
+        # open() читает только заголовок, пиксели не декодируются.
+        with Image.open(upload) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        width = height = None
+    except Exception:
+        # Не картинку отвергнет сам ImageField.
+        return
+    finally:
+        upload.seek(0)
+    if (width is None
+            or max(width, height) > settings.IMAGE_UPLOAD_MAX_SIDE
+            or width * height > settings.IMAGE_UPLOAD_MAX_PIXELS):
+        raise ValidationError(
+            'Картинка больше %(side)s пикселей по стороне '
+            'или %(pixels)s мегапикселей.',
+            code='image_too_large',
+            params={
+                'side': settings.IMAGE_UPLOAD_MAX_SIDE,
+                'pixels': settings.IMAGE_UPLOAD_MAX_PIXELS // 10 ** 6,
+            },
+        )
+
+
+def master_format():
+    """Первый формат из IMAGE_MASTER_FORMATS, который умеет Pillow."""
+    for image_format in settings.IMAGE_MASTER_FORMATS:
+        if image_format != 'WEBP' or features.check('webp'):
+            return image_format
+    return 'JPEG'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def _prepare(image, image_format):
+    if not _has_alpha(image):
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if image_format != 'JPEG':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode(image):
+    """Кодирует по лестнице качеств, пока файл не уложится в лимит.
+
+    Метаданные (EXIF, ICC, комментарии) не переносятся.
+    """
+    image_format = master_format()
+    image = _prepare(image, image_format)
+    for quality in settings.IMAGE_MASTER_QUALITIES:
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, quality=quality, optimize=True)
+        if buffer.tell() <= settings.IMAGE_MASTER_MAX_BYTES:
+            break
+    return buffer.getvalue(), EXTENSIONS[image_format]
+
+
+def make_master(upload):
+    """Мастер-копия загрузки с именем по хэшу содержимого."""
+    limit = settings.IMAGE_MASTER_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        # JPEG сразу декодируется в уменьшенном в 2–8 раз масштабе.
+        image.draft(None, (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+        data, extension = encode(image)
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    return ContentFile(data, name=f'{digest}.{extension}')
+
+
+def process(image):
+    """Проверяет новую загрузку и подменяет её мастер-копией."""
+    if not isinstance(image, UploadedFile):
+        return image
+    check_header(image)
+    return make_master(image)
@@ -1,8 +1,187 @@
-from yatube.settings import NUMBER_OF_POSTS
+from datetime import datetime
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from yatube.settings import NUMBER_OF_POSTS
+
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(obj, field='pub_date', tiebreak='pk'):
+    """Кодирует позицию записи (дата, id) в непрозрачный токен."""
+    value = (f'{getattr(obj, field).isoformat()}{CURSOR_SEPARATOR}'
+             f'{getattr(obj, tiebreak)}')
+    return urlsafe_base64_encode(force_bytes(value))
+
+
+def decode_cursor(token):
+    """Возвращает (дата, id) из токена или None, если токен битый."""
+    try:
+        value = force_str(urlsafe_base64_decode(token))
+        pub_date, pk = value.rsplit(CURSOR_SEPARATOR, 1)
+        return datetime.fromisoformat(pub_date), int(pk)
+    except (TypeError, ValueError):
+        return None
+
+
+class CursorPage:
+    """Страница ленты, выбранная по курсору без COUNT(*) и OFFSET."""
+
+    is_cursor = True
+
+    def __init__(self, paginator, after=None, before=None):
+        self.paginator = paginator
+        self.after = after
+        self.before = before
+
+    def __repr__(self):
+        if self.after:
+            return f'<CursorPage after={self.after}>'
+        if self.before:
+            return f'<CursorPage before={self.before}>'
+        return '<CursorPage first>'
+
+    @cached_property
+    def _rows(self):
+        per_page = self.paginator.per_page
+        field = self.paginator.field
+        tiebreak = self.paginator.tiebreak
+        forward = ('-' if self.paginator.descending else '')
+        backward = ('' if self.paginator.descending else '-')
+        queryset = self.paginator.object_list
+        position = decode_cursor(self.after or self.before or '')
+        if position is None:
+            self.after = self.before = None
+            rows = list(queryset.order_by(
+                forward + field, forward + tiebreak)[:per_page + 1])
+            return rows[:per_page], len(rows) > per_page, False
+        value, pk = position
+        if self.after:
+            lookup = 'lt' if self.paginator.descending else 'gt'
+            order = (forward + field, forward + tiebreak)
+        else:
+            lookup = 'gt' if self.paginator.descending else 'lt'
+            order = (backward + field, backward + tiebreak)
+        rows = list(queryset.filter(
+            Q(**{f'{field}__{lookup}': value})
+            | Q(**{field: value, f'{tiebreak}__{lookup}': pk})
+        ).order_by(*order)[:per_page + 1])
+        if self.after:
+            return rows[:per_page], len(rows) > per_page, True
+        return rows[:per_page][::-1], True, len(rows) > per_page
+
+    @property
+    def object_list(self):
+        return self._rows[0]
+
+    def __len__(self):
+        return len(self.object_list)
 
+    def __getitem__(self, index):
+        return self.object_list[index]
 
-def paginator(request, obj):
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return bool(self.object_list) and self._rows[1]
+
+    def has_previous(self):
+        return bool(self.object_list) and self._rows[2]
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_cursor(self):
+        if self.has_next():
+            return encode_cursor(self.object_list[-1], self.paginator.field,
+                                 self.paginator.tiebreak)
+        return None
+
+    def previous_cursor(self):
+        if self.has_previous():
+            return encode_cursor(self.object_list[0], self.paginator.field,
+                                 self.paginator.tiebreak)
+        return None
+
+
+class CursorPaginator:
+    """Пагинатор по ключу (дата, id): глубина страницы не влияет
+    на стоимость запроса."""
+
+    def __init__(self, object_list, per_page, field='pub_date',
+                 descending=True, tiebreak='pk'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+        self.tiebreak = tiebreak
+        self.descending = descending
+
+    def get_page(self, after=None, before=None):
+        return CursorPage(self, after=after, before=before)
+
+
+def elided_page_range(page, on_each_side=None, on_ends=None):
+    """Номера страниц вокруг текущей и по краям; None — пропуск.
+
+    Ссылок всегда не больше ``2 * (on_each_side + on_ends) + 3``,
+    сколько бы страниц ни было в ленте.
+    """
+    if on_each_side is None:
+        on_each_side = settings.PAGINATOR_ON_EACH_SIDE
+    if on_ends is None:
+        on_ends = settings.PAGINATOR_ON_ENDS
+    number = page.number
+    num_pages = page.paginator.num_pages
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        yield from range(1, num_pages + 1)
+        return
+    if number > on_each_side + on_ends + 2:
+        yield from range(1, on_ends + 1)
+        yield None
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield None
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+def paginator(request, obj, count=None, field='pub_date', tiebreak='pk',
+              cursor=True):
+    """Страница ленты: по курсору или по номеру.
+
+    ``cursor=False`` — всегда по номеру, для выборок, чей порядок не
+    совпадает с ``field`` (например, поиск по релевантности).
+    """
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if cursor and (settings.CURSOR_PAGINATION or after or before):
+        return CursorPaginator(
+            obj, NUMBER_OF_POSTS, field=field, tiebreak=tiebreak
+        ).get_page(after, before)
     paginator = Paginator(obj, NUMBER_OF_POSTS)
+    if count is not None:
+        # Готовый счётчик вместо COUNT(*) по таблице постов.
+        paginator.count = count
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
+
+
+def comments_page(request, comments):
+    """Порция комментариев по курсору ?comments_after=/?comments_before=."""
+    return CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, field='created',
+        descending=False
+    ).get_page(
+        request.GET.get('comments_after'),
+        request.GET.get('comments_before')
+    )
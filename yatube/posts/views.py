@@ -1,32 +1,52 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import paginator
+from .utils import comments_page, paginator
+from .timeline import timeline_posts
+from .counters import author_posts_count
+from .feed_cache import feed_cache
+from .search import search_posts
+from . import conditional
 from django.contrib.auth.decorators import login_required
+from core.routers import use_replica
 
 
+@use_replica
+@conditional.index
 def index(request):
     template = 'posts/index.html'
     post_list = Post.objects.select_related('group', 'author')
     page_obj = paginator(request, post_list)
-    context = {'page_obj': page_obj}
+    context = {
+        'page_obj': page_obj,
+        'feed_cache': feed_cache(request, 'index', 'posts')
+    }
     return render(request, template, context)
 
 
+@use_replica
+@conditional.group_posts
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_obj = paginator(request, posts)
+    page_obj = paginator(request, posts, group.posts_count)
     template = 'posts/group_list.html'
-    context = {'group': group, 'page_obj': page_obj}
+    context = {
+        'group': group,
+        'page_obj': page_obj,
+        'feed_cache': feed_cache(request, 'group', f'group:{group.pk}')
+    }
     return render(request, template, context)
 
 
+@use_replica
+@conditional.profile
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author')
-    posts_count = author.posts.select_related('author').count()
-    page_obj = paginator(request, posts)
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    posts = author.posts.select_related('author', 'group')
+    posts_count = author_posts_count(author)
+    page_obj = paginator(request, posts, posts_count)
     template = 'posts/profile.html'
     following = False
     if request.user.is_authenticated:
@@ -39,17 +59,22 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'posts_count': posts_count,
-        'following': following
+        'following': following,
+        'feed_cache': feed_cache(request, 'profile', f'author:{author.pk}')
     }
     return render(request, template, context)
 
 
+@use_replica
+@conditional.post_detail
 def post_detail(request, post_id):
     form = CommentForm(request.POST or None)
-    posts = get_object_or_404(Post, id=post_id)
-    posts_count = posts.author.posts.select_related('author').count()
+    posts = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'), id=post_id)
+    posts_count = author_posts_count(posts.author)
     template = 'posts/post_detail.html'
-    comments = posts.comments.all()
+    comments = comments_page(
+        request, posts.comments.select_related('author'))
     context = {
         'posts': posts,
         'posts_count': posts_count,
@@ -59,6 +84,15 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = search_posts(Post.objects.select_related('author', 'group'), query)
+    # Курсор по дате сбросил бы сортировку по релевантности.
+    page_obj = paginator(request, posts, cursor=False)
+    context = {'page_obj': page_obj, 'query': query}
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -106,11 +140,19 @@ def add_comment(request, post_id):
 
 
 @login_required
+@use_replica
 def follow_index(request):
     username = request.user.username
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, post_list)
-    context = {'page_obj': page_obj, 'username': username}
+    post_list = timeline_posts(request.user).select_related(
+        'group', 'author')
+    page_obj = paginator(request, post_list, field='timeline_date',
+                         tiebreak='timeline_post')
+    context = {
+        'page_obj': page_obj,
+        'username': username,
+        'feed_cache': feed_cache(
+            request, 'follow', 'posts', f'follow:{request.user.pk}')
+    }
     return render(request, 'posts/follow.html', context)
 
 
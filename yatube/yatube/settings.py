@@ -46,15 +46,19 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'benchmark.apps.BenchmarkConfig',
     'sorl.thumbnail'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,10 +68,13 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template.backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
+            # Режим продакшена: кэширующий загрузчик и прогрев шаблонов
+            # при старте (core.template.backends).
+            'cached': not DEBUG,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -85,13 +92,45 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Выполняются на каждом новом соединении (core.db.backends.sqlite3):
+# WAL не блокирует читателей писателем, а busy_timeout заставляет
+# писателей ждать друг друга вместо «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Постоянные соединения, проверяемые перед первым запросом.
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'PRAGMAS': SQLITE_PRAGMAS,
     }
 }
 
+# Реплики для чтения (core.routers): пути к файлам SQLite через запятую,
+# например DATABASE_REPLICAS=replica.sqlite3. В тестах реплики смотрят
+# в основную базу.
+REPLICA_DATABASES = []
+for number, name in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(','))):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, name),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'replica_pin'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -134,17 +173,145 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# collectstatic добавляет к именам хэш и кладёт рядом .gz/.br (core.files);
+# при разработке статика берётся из STATICFILES_DIRS как есть.
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.files.CompressedManifestStaticFilesStorage'
+# Отдавать STATIC_ROOT и MEDIA_ROOT из Django (core.files.serve). Режим:
+# 'python' — байты отдаёт Django, 'x-sendfile' — заголовок X-Sendfile для
+# Apache/lighttpd, 'x-accel-redirect' — внутренний редирект nginx на
+# X_ACCEL_REDIRECT_PREFIX + путь запроса.
+SERVE_FILES = True
+FILE_SERVING_MODE = 'python'
+X_ACCEL_REDIRECT_PREFIX = '/protected'
+# Кэширование файлов в секундах: с хэшем в имени — на год, остальных — на час.
+FILE_MAX_AGE = 60 * 60
+FILE_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 NUMBER_OF_POSTS = 10
+# Сколько номеров страниц пагинатор показывает вокруг текущей и по краям
+# ленты, остальные сворачиваются в многоточие.
+PAGINATOR_ON_EACH_SIDE = 2
+PAGINATOR_ON_ENDS = 1
+# Курсорная пагинация лент: без COUNT(*) и OFFSET, ссылки ?after=/?before=.
+CURSOR_PAGINATION = False
+COMMENTS_PER_PAGE = 50
+# Лента подписок с разносом постов при записи (fan-out-on-write).
+TIMELINE_FANOUT = False
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+TIMELINE_BATCH_SIZE = 1000
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки пишутся во временный файл, а не держатся в памяти.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Ограничения на картинки постов (posts.uploads), проверяются по размеру
+# файла и заголовку картинки до декодирования.
+IMAGE_UPLOAD_MAX_BYTES = 20 * 2 ** 20
+IMAGE_UPLOAD_MAX_SIDE = 12000
+IMAGE_UPLOAD_MAX_PIXELS = 50 * 10 ** 6
+# Мастер-копия, в которую перекодируется оригинал: первый доступный
+# формат, сторона и размер файла, лестница качеств для его достижения.
+IMAGE_MASTER_FORMATS = ('WEBP', 'JPEG')
+IMAGE_MASTER_MAX_SIDE = 1920
+IMAGE_MASTER_MAX_BYTES = 400 * 2 ** 10
+IMAGE_MASTER_QUALITIES = (85, 75, 65, 55)
+# Общий для всех процессов кэш на шардированных файлах SQLite (core.cache):
+# сброс версий лент в одном процессе сразу виден остальным. В кэше лежат
+# сессии и пользователи, поэтому каталог закрыт от чужих (права 0700).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.ShardedSQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'SHARDS': 8,
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+# Страницы, которые анонимные читатели получают целиком из кэша
+# (core.page_cache); записи сбрасывают их по адресам.
+PAGE_CACHE_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'about:author',
+    'about:tech',
+]
+PAGE_CACHE_TIMEOUT = 60
+# Сколько секунд пользователь сессии живёт в кэше (core.auth).
+USER_CACHE_TIMEOUT = 60
+TEST_RUNNER = 'core.test_runner.TestRunner'
+# Время жизни фрагментов лент; актуальность держат версии (posts.feed_cache).
+FEED_CACHE_TIMEOUT = 60 * 5
+# Миниатюры строятся в фоне (posts.thumbnails) сразу после сохранения поста.
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+# Умеет читать готовые миниатюры целой страницы за раз (prefetch_post_images).
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+# Варианты картинки поста для srcset (тег post_image): пропорции кадра,
+# ширины и форматы от предпочтительного к запасному; WEBP пропускается,
+# если его не умеет Pillow. POST_IMAGE_SIZES — атрибут sizes.
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_SIZES = '(max-width: 768px) 100vw, 720px'
+THUMBNAIL_QUEUE_WORKERS = 2
+# Через сколько секунд снова пробовать картинку, миниатюры которой
+# построить не удалось.
+THUMBNAIL_RETRY_AFTER = 60 * 60
+# Путь в static/ к заглушке; если не задан, показывается оригинал.
+THUMBNAIL_PLACEHOLDER = None
+# Доля запросов, для которых core.middleware пишет Server-Timing и лог.
+REQUEST_TIMING_SAMPLE_RATE = 1.0
+# Сколько одинаковых по форме SQL-запросов считать признаком N+1.
+REQUEST_TIMING_SIMILAR_THRESHOLD = 5
+# Бюджеты рендеринга шаблонов и тегов за запрос в мс (вместе с вложенными);
+# превышение поднимает строку лога до WARNING.
+REQUEST_TIMING_TEMPLATE_BUDGETS = {
+    'posts/includes/follow_post.html': 50,
+    'posts/includes/paginator.html': 5,
+    '{% post_image %}': 20,
+}
+# Строки замеров core.timing (по одному JSON на строку) идут в stderr,
+# а если задан REQUEST_TIMING_LOG — дописываются в этот файл.
+REQUEST_TIMING_LOG = os.getenv('REQUEST_TIMING_LOG')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'timing': {
+            'class': 'logging.FileHandler',
+            'filename': REQUEST_TIMING_LOG,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        } if REQUEST_TIMING_LOG else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+# Полнотекстовый поиск (posts.search): вес свежести в ранжировании
+# и словарь PostgreSQL.
+SEARCH_RECENCY_WEIGHT = 1.0
+SEARCH_POSTGRES_CONFIG = 'russian'
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
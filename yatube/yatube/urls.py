@@ -16,7 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core.files import file_patterns
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -29,7 +30,8 @@ urlpatterns = [
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 handler500 = 'core.views.internal_server_error'
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
+if settings.SERVE_FILES:
+    urlpatterns += (
+        file_patterns(settings.STATIC_URL, settings.STATIC_ROOT)
+        + file_patterns(settings.MEDIA_URL, settings.MEDIA_ROOT)
     )
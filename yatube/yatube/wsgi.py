@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# В режиме продакшена шаблоны разбираются до первого запроса.
+from core.template.backends import warm  # noqa: E402
+
+warm()